@@ -1,20 +1,30 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session, Response, stream_with_context, make_response
 import os
+import io
 from dotenv import load_dotenv
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
 import uuid
+import time
+import threading
 import shutil
+import tempfile
 from werkzeug.utils import secure_filename
-import PyPDF2
-import pytesseract
-from pdf2image import convert_from_path
-import requests
 import json
-import re
-import ast
 import tax_calculator
+import db_pool
+import jobs
+import gemini_client
+import prefetch
+import bulk
+import user_financials_store
+import instrumentation
+import health
+import page_cache
+import session_store
+from conversation_log import ConversationLog
+import extraction
+from contextlib import contextmanager
 from datetime import datetime
 from decimal import Decimal # NEW IMPORT
 
@@ -36,30 +46,97 @@ class CustomJSONEncoder(json.JSONEncoder):
 
 app = Flask(__name__)
 app.json_encoder = CustomJSONEncoder # Use the custom encoder for all jsonify calls
-app.secret_key = os.urandom(24)
-
-UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
+# Stable across workers and restarts, so Flask's signed session cookie stays valid
+app.secret_key = session_store.load_secret_key(
+    os.getenv('SECRET_KEY_FILE', os.path.join(app.instance_path, 'secret_key')))
+instrumentation.init_app(app)
+
+# Request-independent pages are rendered once and served precompressed with ETags;
+# dynamic templates cache input-determined blocks with {% call cached(...) %}
+static_pages = page_cache.StaticPages(app)
+fragment_cache = page_cache.FragmentCache()
+app.jinja_env.globals['cached'] = fragment_cache
+app.jinja_env.globals['slab_rows'] = tax_calculator.slab_rows
+
+# Uploads that must reach disk (large or scanned PDFs, for OCR) go here until their job ends
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(tempfile.gettempdir(), 'tax_advisor_uploads'))
 ALLOWED_EXTENSIONS = {'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max
 
+# Stream advisor suggestions to the browser instead of waiting for the full answer
+ADVISOR_STREAMING = os.getenv('ADVISOR_STREAMING', '1') == '1'
+
+# A stream holds its worker thread for the whole generation, so at most this many run at
+# once per process (default: half of gunicorn's threads); the rest are told to retry shortly
+ADVISOR_MAX_STREAMS = int(os.getenv('ADVISOR_MAX_STREAMS', str(max(1, int(os.getenv('WEB_THREADS', '8')) // 2))))
+ADVISOR_STREAM_RETRY_MS = int(os.getenv('ADVISOR_STREAM_RETRY_MS', '2000'))
+advisor_stream_slots = threading.BoundedSemaphore(ADVISOR_MAX_STREAMS)
+
+# Generate the advisor's opening question speculatively at /calculate time
+ADVISOR_PREFETCH = os.getenv('ADVISOR_PREFETCH', '1') == '1'
+# Seconds the advisor page waits for a prefetch still in flight before asking Gemini itself
+ADVISOR_PREFETCH_WAIT = float(os.getenv('ADVISOR_PREFETCH_WAIT', '2'))
+
+# Advisor conversations, written by a background thread with rotation
+conversation_log = ConversationLog(
+    os.getenv('CONVERSATION_LOG_PATH', 'ai_conversation_log.json'),
+    max_bytes=int(os.getenv('CONVERSATION_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    rotate_daily=os.getenv('CONVERSATION_LOG_ROTATE_DAILY', '1') == '1',
+    compress=os.getenv('CONVERSATION_LOG_COMPRESS', '1') == '1',
+    encoder=CustomJSONEncoder,
+)
+
+# Worker processes per /bulk-calculate request (1 = compute in the request thread)
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', '1'))
+
+# Server-side state of each user's flow (see session_store.py for SESSION_* settings);
+# the browser only carries the session id, in Flask's session cookie
+session_state = session_store.create_session_store_from_env(encoder=CustomJSONEncoder)
+
+def current_session_id(create=False):
+    """The session id from the form (API clients), else the cookie; a new one if `create`"""
+    session_id = request.form.get('session_id') or session.get('session_id')
+    if not session_id and create:
+        session_id = str(uuid.uuid4())
+    if session_id:
+        session['session_id'] = session_id
+    return session_id
+
+def store_extracted(job_id, session_id, extracted):
+    session_state.update(session_id, upload_job_id=job_id, extracted=extracted)
+
+# Background document extraction (see jobs.py for JOB_* settings)
+extraction_pipeline = jobs.create_pipeline_from_env(on_done=store_extracted)
+
+@contextmanager
 def get_db_connection():
-    """Create and return a database connection"""
+    """Check a connection out of the process-wide pool; yields None if the DB is unavailable"""
     try:
-        connection = psycopg2.connect(os.getenv('DB_URL'))
-        return connection
+        pool = db_pool.get_pool()
+        with instrumentation.span('db_connect'):
+            conn = pool.getconn()
     except Exception as e:
         logger.error(f"Database connection error: {e}")
-        return None
+        yield None
+        return
+    try:
+        yield conn
+    except Exception:
+        pool.putconn(conn, discard=conn.closed)
+        raise
+    else:
+        pool.putconn(conn)
 
 def test_db_connection():
     """Test database connectivity"""
     try:
-        conn = get_db_connection()
-        if conn:
-            conn.close()
-            return True
-        return False
+        with get_db_connection() as conn:
+            if conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                return True
+            return False
     except Exception as e:
         logger.error(f"Database test failed: {e}")
         return False
@@ -67,24 +144,69 @@ def test_db_connection():
 @app.route('/')
 def index():
     """Landing page route"""
-    return render_template('index.html')
+    return static_pages.response('index.html')
+
+HEALTH_DB_CHECKOUT_TIMEOUT = float(os.getenv('HEALTH_DB_CHECKOUT_TIMEOUT', '0.5'))
+
+def _db_health_check():
+    # Straight from the pool: failures are reported by the monitor, not logged on every probe
+    try:
+        with db_pool.get_pool().connection(timeout=HEALTH_DB_CHECKOUT_TIMEOUT) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+    except db_pool.PoolTimeout as e:
+        # Every connection is checked out by requests: the database is busy, not down
+        return f"pool busy ({e})"
+    return "SELECT 1 ok"
+
+# Dependency probes run in the background; the health endpoints only read their cached results
+health_monitor = health.HealthMonitor()
+health_monitor.register('db', _db_health_check)
+health_monitor.register('gemini', gemini_client.ping)
+health_monitor.register('tesseract', health.tesseract_check)
+
+@app.route('/health/live')
+def liveness():
+    """Liveness probe: the process is up and serving requests; no dependency is checked"""
+    return jsonify({'status': 'alive', 'uptime_s': round(time.time() - health_monitor.started_at, 1)})
+
+@app.route('/health/ready')
+def readiness():
+    """Readiness probe: 503 while a required dependency is failing or its check is stale"""
+    ready, status, checks = health_monitor.report()
+    return jsonify({'status': status, 'checks': checks}), 200 if ready else 503
 
 @app.route('/health')
 def health_check():
     """Health check endpoint for deployment"""
-    db_status = "connected" if test_db_connection() else "disconnected"
+    ready, status, checks = health_monitor.report()
     
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if ready else 'unhealthy',
         'phase': '1',
-        'database': db_status,
+        'database': "connected" if checks['db']['ok'] else "disconnected",
+        'checks': checks,
+        'db_pool': db_pool.get_pool().stats(),
+        'llm_cache': extraction.llm_cache.stats() if extraction.llm_cache else None,
+        'text_cache': extraction.text_cache.stats() if extraction.text_cache else None,
+        'gemini': gemini_client.stats(),
+        'advisor_prefetch': advisor_prefetcher.stats() if advisor_prefetcher else None,
+        'user_financials_cache': user_financials_cache.stats(),
+        'static_pages': static_pages.stats(),
+        'fragment_cache': fragment_cache.stats(),
+        'conversation_log': conversation_log.stats(),
         'environment': 'development' if app.debug else 'production'
     })
 
+@app.route('/metrics')
+def metrics():
+    """Request and stage latency histograms in the Prometheus text format"""
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
-    return render_template('index.html'), 404
+    return static_pages.response('index.html', status=404)
 
 @app.errorhandler(500)
 def internal_error(error):
@@ -96,157 +218,40 @@ def internal_error(error):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Helper: mock Gemini LLM extraction (replace with real API in prod)
-def extract_structured_data(text):
-    """
-    Use Gemini LLM to extract structured salary/tax data from text.
-    Returns a dict with UserFinancials fields.
-    Enhanced with error handling and logging.
-    Logs extracted text and Gemini response for debugging.
-    """
-    import logging
-    logger = logging.getLogger("gemini_extraction")
-    api_key = os.getenv('GEMINI_API_KEY')
-    endpoint = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent'
-
-    # Log the extracted text
-    logger.info(f"Extracted text length: {len(text)}")
-    logger.debug(f"Extracted text (first 500 chars): {text[:500]}")
-    if not text or len(text.strip()) < 30:
-        logger.warning("Extracted text is empty or too short. PDF extraction may have failed.")
-
-    prompt = (
-        """
-        You are an expert financial data extractor. Analyze the following text from a salary slip or Form 16.
-        First, determine if the document represents a single month's salary.
-        If it is a monthly payslip, you MUST multiply the values for the fields gross_salary, basic_salary, hra_received, professional_tax, and tds by 12 to get the annual amount.
-        Fields like deduction_80c, deduction_80d, and rent_paid should be assumed to be annual figures and should NOT be multiplied.
-        
-        Return ONLY a valid JSON object with the following keys, containing the correct annual numeric values (use 0 if a value is not found):
-        - gross_salary
-        - basic_salary
-        - hra_received
-        - rent_paid
-        - deduction_80c
-        - deduction_80d
-        - standard_deduction
-        - professional_tax
-        - tds
-        
-        Do not include any explanation, only the final JSON object.
-        Example for a monthly slip with 50,000 gross salary: {"gross_salary": 600000, ...}
-        
-        Text:
-        """ + text.strip()[:6000] + "\n"
-    )
-    headers = {
-        'Content-Type': 'application/json',
-    }
-    params = {
-        'key': api_key
-    }
-    data = {
-        "contents": [{"parts": [{"text": prompt}]}]
-    }
-    try:
-        logger.info("Sending request to Gemini API...")
-        resp = requests.post(endpoint, headers=headers, params=params, data=json.dumps(data), timeout=30)
-        logger.info(f"Gemini API status: {resp.status_code}")
-        logger.debug(f"Request payload: {data}")
-        resp.raise_for_status()
-        result = resp.json()
-        logger.debug(f"Gemini API response (raw): {result}")
-        # Parse Gemini's response for JSON
-        candidates = result.get('candidates', [])
-        if not candidates:
-            logger.error("No candidates in Gemini response.")
-        else:
-            content = candidates[0].get('content', {})
-            parts = content.get('parts', [])
-            if not parts:
-                logger.error("No parts in Gemini candidate content.")
-            else:
-                response_text = parts[0].get('text', '')
-                logger.debug(f"Gemini response text: {response_text}")
-                match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if match:
-                    try:
-                        data_dict = json.loads(match.group(0))
-                        logger.info(f"Extracted structured data: {data_dict}")
-                    except Exception as e:
-                        logger.warning(f"json.loads failed: {e}, trying ast.literal_eval...")
-                        try:
-                            data_dict = ast.literal_eval(match.group(0))
-                            logger.info(f"Extracted structured data (ast): {data_dict}")
-                        except Exception as e2:
-                            logger.error(f"Failed to parse Gemini JSON: {e2}")
-                            data_dict = None
-                    if data_dict:
-                        # Fill missing fields with 0
-                        fields = [
-                            'gross_salary', 'basic_salary', 'hra_received', 'rent_paid',
-                            'deduction_80c', 'deduction_80d', 'standard_deduction',
-                            'professional_tax', 'tds'
-                        ]
-                        for f in fields:
-                            if f not in data_dict:
-                                logger.warning(f"Field '{f}' missing in Gemini response. Setting to 0.")
-                                data_dict[f] = 0
-                        return data_dict
-                else:
-                    logger.error("No JSON object found in Gemini response text.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request to Gemini API failed: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error in Gemini extraction: {e}")
-    # Fallback: return empty/defaults
-    logger.warning("Falling back to default values for extracted data.")
-    return {
-        'gross_salary': 0,
-        'basic_salary': 0,
-        'hra_received': 0,
-        'rent_paid': 0,
-        'deduction_80c': 0,
-        'deduction_80d': 0,
-        'standard_deduction': 50000,
-        'professional_tax': 0,
-        'tds': 0,
-    }
+def fetch_user_financials(session_id):
+    """Fetches user financial data from the database."""
+    with get_db_connection() as conn:
+        if not conn:
+            return None
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                with instrumentation.span('db_query'):
+                    cur.execute(user_financials_store.SELECT_SQL, (session_id,))
+                    user_data = cur.fetchone()
+                return user_data
+        except Exception as e:
+            logger.error(f"Error fetching user data: {e}")
+            return None
+
+# Per-process read-through cache of session rows; /calculate writes through it
+user_financials_cache = user_financials_store.UserFinancialsCache(
+    fetch_user_financials,
+    ttl=int(os.getenv('USER_CACHE_TTL', '300')),
+    max_entries=int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000')),
+)
 
 def get_user_financials(session_id):
-    """Fetches user financial data from the database."""
-    conn = get_db_connection()
-    if not conn:
-        return None
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM UserFinancials WHERE session_id = %s", (session_id,))
-            user_data = cur.fetchone()
-            return user_data
-    except Exception as e:
-        logger.error(f"Error fetching user data: {e}")
-        return None
-    finally:
-        conn.close()
+    """User financial data for a session: session state, then the in-memory cache, then the DB."""
+    financials = session_state.get(session_id, 'financials')
+    if financials:
+        return financials
+    return user_financials_cache.get(session_id)
 
 def ask_gemini(prompt):
     """Generic helper function to call Gemini API and get text response."""
-    api_key = os.getenv('GEMINI_API_KEY')
-    endpoint = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent'
-    headers = {'Content-Type': 'application/json'}
-    params = {'key': api_key}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        resp = requests.post(endpoint, headers=headers, params=params, data=json.dumps(data), timeout=45)
-        resp.raise_for_status()
-        result = resp.json()
-        return result['candidates'][0]['content']['parts'][0]['text']
-    except Exception as e:
-        logger.error(f"Gemini API call failed: {e}")
-        return None
+    return gemini_client.generate_text(prompt)
 
-# Route: PDF upload and extraction
+# Route: PDF upload, queued for background extraction
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
@@ -259,49 +264,84 @@ def upload():
             return redirect(request.url)
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
+            # A new upload starts a new session
             session_id = str(uuid.uuid4())
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
-            file.save(save_path)
-            # Extract text from PDF
-            try:
-                text = ""
-                # Try PyPDF2 first
-                with open(save_path, 'rb') as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-                    for page in reader.pages:
-                        text += page.extract_text() or ''
-                # If text is too short, try OCR
-                if len(text.strip()) < 50:
-                    images = convert_from_path(save_path)
-                    for img in images:
-                        text += pytesseract.image_to_string(img)
-                # Mock Gemini LLM extraction
-                extracted = extract_structured_data(text)
-                extracted['session_id'] = session_id
-            except Exception as e:
-                flash(f'Extraction failed: {e}', 'danger')
-                os.remove(save_path)
-                return redirect(request.url)
-            # Delete file after extraction
+            session['session_id'] = session_id
+            with instrumentation.span('upload_spool'):
+                spool, file_hash, size = extraction.spool_upload(file.stream)
+            save_path = None
             try:
-                os.remove(save_path)
-            except Exception:
-                pass
-            # Render form with extracted data
-            # Ensure tax_regime is initialized for the form
-            if 'tax_regime' not in extracted:
-                extracted['tax_regime'] = 'new'
-            return render_template('form.html', data=extracted)
+                # Page count and text layer decide the strategy before any text is extracted
+                info = extraction.inspect_pdf(spool)
+                if size <= extraction.UPLOAD_SPOOL_MAX_MEMORY and all(info['text_layer']):
+                    source = spool.read()   # small text PDF: never touches disk
+                else:
+                    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
+                    extraction.write_spool(spool, save_path)
+                    source = save_path
+                # Hand off to the extraction pipeline; the worker deletes the file when done
+                job_id = extraction_pipeline.submit(source, session_id, file_hash, info['text_layer'])
+            except extraction.DocumentRejected as e:
+                flash(f'{e}', 'danger')
+                return render_template('upload.html'), 400
+            except jobs.QueueFull as e:
+                if save_path:
+                    os.remove(save_path)
+                flash(f'{e}', 'danger')
+                return render_template('upload.html'), 503
+            finally:
+                spool.close()
+            return redirect(url_for('upload_status', job_id=job_id))
         else:
             flash('Invalid file type. Only PDF allowed.', 'danger')
             return redirect(request.url)
-    # GET: show upload form
-    return render_template('upload.html')
+    # GET: show upload form (the pre-rendered copy unless there are messages to flash).
+    # Error paths redirect here with a flash, so the browser must always ask again
+    if session.get('_flashes'):
+        response = make_response(render_template('upload.html'))
+        response.cache_control.no_store = True
+        return response
+    return static_pages.response('upload.html', revalidate=True)
+
+# Route: extraction job status (HTML, polls until the form is ready)
+@app.route('/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    job = extraction_pipeline.get(job_id)
+    if not job:
+        # Finished on another worker: its result is in the shared session state
+        state = session_state.get(session.get('session_id'))
+        if state.get('upload_job_id') == job_id and state.get('extracted'):
+            job = {'status': jobs.STATUS_DONE, 'result': state['extracted']}
+    if not job:
+        flash('Upload not found or expired. Please upload again.', 'danger')
+        return redirect(url_for('upload'))
+    if job['status'] == jobs.STATUS_FAILED:
+        flash(f"Extraction failed: {job['error']}", 'danger')
+        return redirect(url_for('upload'))
+    if job['status'] != jobs.STATUS_DONE:
+        return render_template('processing.html', job=job)
+    # Render form with extracted data
+    extracted = job['result']
+    # Ensure tax_regime is initialized for the form
+    if 'tax_regime' not in extracted:
+        extracted['tax_regime'] = 'new'
+    extracted.setdefault('assessment_year', tax_calculator.DEFAULT_ASSESSMENT_YEAR)
+    return render_template('form.html', data=extracted,
+                           assessment_years=tax_calculator.available_assessment_years())
+
+# Route: extraction job status (JSON, for polling clients)
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = extraction_pipeline.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
 # Route: Data review form (optional direct access)
 @app.route('/form', methods=['GET'])
 def form():
-    # For demo, show empty form
+    # Empty form, identical for every visitor: the session id travels in the session cookie
     empty = {
         'gross_salary': '',
         'basic_salary': '',
@@ -312,113 +352,365 @@ def form():
         'standard_deduction': '50000',
         'professional_tax': '',
         'tds': '',
-        'session_id': str(uuid.uuid4()),
+        'metro': False,
         'tax_regime': 'new',
+        'assessment_year': tax_calculator.DEFAULT_ASSESSMENT_YEAR,
     }
-    return render_template('form.html', data=empty)
+    return static_pages.response('form.html', data=empty,
+                                 assessment_years=tax_calculator.available_assessment_years())
 
 @app.route('/calculate', methods=['POST'])
 def calculate():
     """
-    Receives form data, saves to DB, calculates tax, and shows results.
+    Receives form data, saves to DB, calculates tax, and shows results
+    (as JSON when the client prefers application/json).
     """
     form_data = request.form.to_dict()
-    session_id = form_data.get('session_id')
+    session_id = current_session_id(create=True)
+    form_data['session_id'] = session_id
 
     # Save to DB
-    conn = get_db_connection()
-    if conn:
-        try:
-            with conn.cursor() as cur:
-                # Upsert UserFinancials
-                cur.execute("""
-                    INSERT INTO UserFinancials (session_id, gross_salary, basic_salary, hra_received, rent_paid, deduction_80c, deduction_80d, standard_deduction, professional_tax, tds)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (session_id) DO UPDATE SET
-                        gross_salary = EXCLUDED.gross_salary,
-                        basic_salary = EXCLUDED.basic_salary,
-                        hra_received = EXCLUDED.hra_received,
-                        rent_paid = EXCLUDED.rent_paid,
-                        deduction_80c = EXCLUDED.deduction_80c,
-                        deduction_80d = EXCLUDED.deduction_80d,
-                        standard_deduction = EXCLUDED.standard_deduction,
-                        professional_tax = EXCLUDED.professional_tax,
-                        tds = EXCLUDED.tds;
-                """, (
-                    session_id, form_data.get('gross_salary'), form_data.get('basic_salary'), form_data.get('hra_received'),
-                    form_data.get('rent_paid'), form_data.get('deduction_80c'), form_data.get('deduction_80d'),
-                    form_data.get('standard_deduction'), form_data.get('professional_tax'), form_data.get('tds')
-                ))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"DB Error on save: {e}")
-        finally:
-            conn.close()
+    saved_row = None
+    with get_db_connection() as conn:
+        if conn:
+            try:
+                with instrumentation.span('db_query'):
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        # Upsert UserFinancials
+                        cur.execute("""
+                            INSERT INTO UserFinancials (session_id, gross_salary, basic_salary, hra_received, rent_paid, deduction_80c, deduction_80d, standard_deduction, professional_tax, tds, metro)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (session_id) DO UPDATE SET
+                                gross_salary = EXCLUDED.gross_salary,
+                                basic_salary = EXCLUDED.basic_salary,
+                                hra_received = EXCLUDED.hra_received,
+                                rent_paid = EXCLUDED.rent_paid,
+                                deduction_80c = EXCLUDED.deduction_80c,
+                                deduction_80d = EXCLUDED.deduction_80d,
+                                standard_deduction = EXCLUDED.standard_deduction,
+                                professional_tax = EXCLUDED.professional_tax,
+                                tds = EXCLUDED.tds,
+                                metro = EXCLUDED.metro
+                            RETURNING """ + ', '.join(user_financials_store.COLUMNS) + ";", (
+                            session_id, form_data.get('gross_salary'), form_data.get('basic_salary'), form_data.get('hra_received'),
+                            form_data.get('rent_paid'), form_data.get('deduction_80c'), form_data.get('deduction_80d'),
+                            form_data.get('standard_deduction'), form_data.get('professional_tax'), form_data.get('tds'),
+                            tax_calculator.is_metro(form_data.get('metro'))
+                        ))
+                        saved_row = cur.fetchone()
+                    conn.commit()
+            except Exception as e:
+                logger.error(f"DB Error on save: {e}")
+                saved_row = None
 
-    # Calculate Tax
-    net_old = tax_calculator.get_net_taxable_income_old(form_data)
-    net_new = tax_calculator.get_net_taxable_income_new(form_data)
-    tax_old = tax_calculator.calculate_old_regime_tax(net_old)
-    tax_new = tax_calculator.calculate_new_regime_tax(net_new)
+    if saved_row:
+        user_financials_cache.put(session_id, saved_row)
+    else:
+        user_financials_cache.invalidate(session_id)
+
+    # Start generating the advisor's opening question while the user reads the results
+    if advisor_prefetcher and saved_row:
+        advisor_prefetcher.schedule(session_id, saved_row)
+
+    results_data = compute_results(form_data, session_id, form_data.get('tax_regime'),
+                                   form_data.get('assessment_year'))
+    # New numbers: drop the previous advisor exchange along with the old results
+    session_state.update(session_id, financials=saved_row, results=results_data,
+                         advisor_question=None, advisor=None)
+    if wants_json():
+        return jsonify(results_data)
+    return render_template('results.html', results=results_data)
 
-    results_data = {
+def compute_results(data, session_id, selected_regime, assessment_year):
+    """
+    Both regimes' tax and the break-even deduction, as shown on the results page,
+    with whether the remaining 80C/80D headroom can reach it
+    """
+    if assessment_year not in tax_calculator.available_assessment_years():
+        assessment_year = tax_calculator.DEFAULT_ASSESSMENT_YEAR
+    with instrumentation.span('tax_compute'):
+        net_old = tax_calculator.get_net_taxable_income_old(data)
+        net_new = tax_calculator.get_net_taxable_income_new(data)
+        tax_old = tax_calculator.calculate_old_regime_tax(net_old, assessment_year)
+        tax_new = tax_calculator.calculate_new_regime_tax(net_new, assessment_year)
+        break_even = tax_calculator.break_even_deduction(data, assessment_year)
+        headroom = tax_calculator.deduction_headroom(data)
+
+    return {
         'session_id': session_id,
         'tax_old_regime': tax_old,
         'tax_new_regime': tax_new,
-        'selected_regime': form_data.get('tax_regime')
+        'selected_regime': selected_regime,
+        'assessment_year': assessment_year,
+        'break_even_deduction': break_even,
+        'deduction_headroom': headroom,
+        'break_even_within_limits': break_even <= headroom,
     }
 
-    return render_template('results.html', results=results_data)
+def wants_json():
+    """True when application/json is the client's first choice (browsers send text/html first)"""
+    return request.accept_mimetypes.best == 'application/json'
 
-@app.route('/advisor/<session_id>', methods=['GET', 'POST'])
-def advisor(session_id):
-    user_data = get_user_financials(session_id)
-    if not user_data:
+# Route: the last results of a session again (back navigation, reloads) without recomputing
+@app.route('/results/<session_id>', methods=['GET'])
+def results_page(session_id):
+    results_data = session_state.get(session_id, 'results')
+    if not results_data:
         flash("Session not found. Please start over.", "danger")
         return redirect(url_for('index'))
+    return render_template('results.html', results=results_data)
 
-    if request.method == 'POST':
-        # Step 2: Generate suggestions
-        question = request.form.get('question')
-        answer = request.form.get('answer')
+# Route: results of a saved session as JSON, for clients that render their own view
+@app.route('/api/results/<session_id>', methods=['GET'])
+def results_api(session_id):
+    """?assessment_year= selects the slab schedule; ?regime= the highlighted regime."""
+    stored = session_state.get(session_id, 'results')
+    if stored and not request.args:
+        return jsonify(stored)
+    data = get_user_financials(session_id)
+    if not data:
+        return jsonify({'error': 'Session not found'}), 404
+    assessment_year = request.args.get('assessment_year', tax_calculator.DEFAULT_ASSESSMENT_YEAR)
+    if assessment_year not in tax_calculator.available_assessment_years():
+        return jsonify({'error': f'Unknown assessment year {assessment_year}'}), 400
+    try:
+        return jsonify(compute_results(data, session_id, request.args.get('regime'), assessment_year))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid financial data: {e}'}), 400
+
+# Route: regime optimizer (break-even deduction and marginal savings per category)
+@app.route('/api/optimize', methods=['POST'])
+@app.route('/api/optimize/<session_id>', methods=['GET'])
+def optimize(session_id=None):
+    """
+    What-if numbers for a saved session, or for the financial fields posted as
+    JSON. ?assessment_year= selects the slab schedule; ?points= the curve size.
+    """
+    if session_id:
+        data = get_user_financials(session_id)
+        if not data:
+            return jsonify({'error': 'Session not found'}), 404
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object of financial fields'}), 400
+    assessment_year = request.args.get('assessment_year')
+    if assessment_year and assessment_year not in tax_calculator.available_assessment_years():
+        return jsonify({'error': f'Unknown assessment year {assessment_year}'}), 400
+    points = min(max(request.args.get('points', 11, type=int), 2), 101)
+    try:
+        return jsonify(tax_calculator.optimize(data, assessment_year, points))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid financial data: {e}'}), 400
+
+SUGGESTIONS_FALLBACK = "Sorry, I couldn't generate suggestions at this time."
+DEFAULT_ADVISOR_QUESTION = "What is your primary goal for tax-saving this year?"
 
-        suggestion_prompt = f"""
-            You are an expert tax advisor in India. Based on the user's financial data, your initial question, and their answer, provide a list of 3-5 personalized, actionable tax-saving suggestions. Format the response as a simple, unformatted list separated by newlines, with each suggestion starting with a hyphen.
+def tax_analysis_for_prompt(user_data):
+    """Precomputed optimizer figures for the advisor prompt, so Gemini doesn't do the arithmetic."""
+    try:
+        return json.dumps(tax_calculator.optimize(user_data, points=5), indent=2)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Optimizer failed for advisor prompt: {e}")
+        return "unavailable"
+
+def build_suggestion_prompt(user_data, question, answer):
+    """Prompt for the advisor's personalized suggestions."""
+    return f"""
+            You are an expert tax advisor in India. Based on the user's financial data, the precomputed tax analysis, your initial question, and their answer, provide a list of 3-5 personalized, actionable tax-saving suggestions. Quote rupee amounts from the tax analysis rather than computing them yourself. Format the response as a simple, unformatted list separated by newlines, with each suggestion starting with a hyphen.
 
             User's Financial Data: {json.dumps(user_data, indent=2, cls=CustomJSONEncoder)}
+            Tax Analysis (tax totals include cess; break_even_deduction is the extra Old Regime deduction at which both regimes cost the same; each category's curve shows the saving from extra investment up to the statutory limit): {tax_analysis_for_prompt(user_data)}
             Your Initial Question: "{question}"
             User's Answer: "{answer}"
         """
-        suggestions_text = ask_gemini(suggestion_prompt)
-        suggestions = suggestions_text.strip().split('\n') if suggestions_text else ["Sorry, I couldn't generate suggestions at this time."]
-        
-        # Log conversation
-        log_entry = {
-            "session_id": session_id,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "initial_question": question,
-            "user_answer": answer,
-            "final_suggestions": suggestions_text
-        }
-        try:
-            with open("ai_conversation_log.json", "a") as f:
-                f.write(json.dumps(log_entry, cls=CustomJSONEncoder) + "\n")
-        except Exception as e:
-            logger.error(f"Failed to write to conversation log: {e}")
 
-        return render_template('ask.html', suggestions=suggestions, question=question, answer=answer)
+def log_conversation(session_id, question, answer, suggestions_text):
+    """Queue one advisor exchange for the conversation log (written in the background)."""
+    log_entry = {
+        "session_id": session_id,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "initial_question": question,
+        "user_answer": answer,
+        "final_suggestions": suggestions_text
+    }
+    conversation_log.write(log_entry)
 
-    # Step 1: Generate question
+# Route: bulk tax computation for a payroll roster (CSV in, CSV out)
+@app.route('/bulk-calculate', methods=['POST'])
+def bulk_calculate():
+    """
+    Accepts a CSV upload ('roster') of UserFinancials rows and streams back
+    every row with both regimes' tax and the recommended regime.
+    """
+    roster = request.files.get('roster')
+    if not roster or roster.filename == '':
+        return jsonify({'error': "Upload a CSV file in the 'roster' field"}), 400
+    assessment_year = request.form.get('assessment_year') or tax_calculator.DEFAULT_ASSESSMENT_YEAR
+    if assessment_year not in tax_calculator.available_assessment_years():
+        return jsonify({'error': f"Unknown assessment year: {assessment_year}"}), 400
+    try:
+        chunk_size = int(request.form.get('chunk_size', bulk.DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({'error': 'chunk_size must be a whole number'}), 400
+    if chunk_size < 1:
+        return jsonify({'error': 'chunk_size must be at least 1'}), 400
+    chunk_size = min(chunk_size, bulk.DEFAULT_CHUNK_SIZE)
+
+    # Keep our own handle on the upload; the request's file may be closed before the response is streamed
+    upload = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(roster.stream, upload)
+    upload.seek(0)
+
+    def generate():
+        with io.TextIOWrapper(upload, encoding='utf-8-sig', newline='') as stream:
+            chunks = bulk.read_csv_chunks(stream, chunk_size)
+            yield from bulk.iter_csv_output(bulk.compute_chunks(chunks, BULK_WORKERS, assessment_year))
+
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=tax_results.csv'})
+
+def generate_advisor_question(user_data):
+    """Ask Gemini for the advisor's opening question; None if it is unavailable."""
     question_prompt = f"""
         You are a friendly financial advisor. Based on the user's summarized annual financial data, ask one single, concise, and thought-provoking question to better understand their financial goals or habits. The question should help you give better tax advice. Ask about their goals or habits, not for more numbers. Return ONLY the question.
         
         Example: If deduction_80c is 0, you might ask: "Are you currently exploring any tax-saving investment options like ELSS or PPF?"
         
         User's Data: {json.dumps(user_data, indent=2, cls=CustomJSONEncoder)}
+        Tax Analysis: {tax_analysis_for_prompt(user_data)}
     """
-    question = ask_gemini(question_prompt) or "What is your primary goal for tax-saving this year?"
+    question = ask_gemini(question_prompt)
+    return question.strip() if question else None
+
+def store_prefetched_question(session_id, question):
+    """Prefetcher hook: share the question with every worker through the session state"""
+    session_state.update(session_id, advisor_question=question.strip())
+
+# Opening questions generated in the background right after /calculate saves the data
+advisor_prefetcher = None
+if ADVISOR_PREFETCH:
+    advisor_prefetcher = prefetch.AdvisorPrefetcher(
+        generate_advisor_question,
+        ttl=int(os.getenv('ADVISOR_PREFETCH_TTL', '600')),
+        max_entries=int(os.getenv('ADVISOR_PREFETCH_MAX_ENTRIES', '1000')),
+        max_pending=int(os.getenv('ADVISOR_PREFETCH_MAX_PENDING', '8')),
+        on_done=store_prefetched_question,
+    )
+
+@app.route('/advisor/<session_id>', methods=['GET', 'POST'])
+def advisor(session_id):
+    user_data = get_user_financials(session_id)
+    if not user_data:
+        flash("Session not found. Please start over.", "danger")
+        return redirect(url_for('index'))
+
+    if request.method == 'POST':
+        # Step 2: Generate suggestions for the question asked in step 1
+        question = (request.form.get('question') or session_state.get(session_id, 'advisor_question')
+                    or DEFAULT_ADVISOR_QUESTION)
+        answer = request.form.get('answer')
+        suggestions_text = stored_suggestions(session_id, question, answer)
+        if suggestions_text is None:
+            # A new exchange: the stream endpoint reads the question and answer from here
+            session_state.update(session_id, advisor={'question': question, 'answer': answer})
+
+        if ADVISOR_STREAMING and suggestions_text is None:
+            # Render the page right away; the browser streams the suggestions in
+            stream_url = url_for('advisor_stream', session_id=session_id)
+            return render_template('ask.html', stream_url=stream_url, question=question, answer=answer)
+
+        if suggestions_text is None:
+            suggestions_text = ask_gemini(build_suggestion_prompt(user_data, question, answer))
+            save_suggestions(session_id, question, answer, suggestions_text)
+        suggestions = suggestions_text.strip().split('\n') if suggestions_text else [SUGGESTIONS_FALLBACK]
+        return render_template('ask.html', suggestions=suggestions, question=question, answer=answer)
+
+    # Step 1: Generate question (kept in the session state, usually prefetched by /calculate)
+    # Read past this worker's memory copy: the prefetch may have finished on another worker
+    question = session_state.get(session_id, 'advisor_question', fresh=True)
+    if not question and advisor_prefetcher:
+        # Still in flight on this worker: wait briefly before asking Gemini directly
+        question = advisor_prefetcher.take_question(session_id, wait=ADVISOR_PREFETCH_WAIT)
+    if not question:
+        question = generate_advisor_question(user_data)
+    if question:
+        session_state.update(session_id, advisor_question=question.strip())
+    question = question or DEFAULT_ADVISOR_QUESTION
     return render_template('ask.html', question=question.strip(), session_id=session_id)
 
+def stored_suggestions(session_id, question, answer):
+    """Suggestions already generated for this exact question and answer, or None"""
+    exchange = session_state.get(session_id, 'advisor') or {}
+    if exchange.get('question') == question and exchange.get('answer') == answer:
+        return exchange.get('suggestions')
+    return None
+
+def save_suggestions(session_id, question, answer, suggestions_text):
+    """Log the exchange and keep a successful one, so a reload doesn't ask Gemini again"""
+    log_conversation(session_id, question, answer, suggestions_text)
+    if suggestions_text:
+        session_state.update(session_id, advisor={'question': question, 'answer': answer,
+                                                  'suggestions': suggestions_text})
+
+# Route: advisor suggestions as server-sent events
+@app.route('/advisor/<session_id>/stream', methods=['GET'])
+def advisor_stream(session_id):
+    """
+    Streams Gemini's suggestions to the browser as they are generated.
+    Events: 'message' with {"text": chunk}, then 'done'. When ADVISOR_MAX_STREAMS
+    are already running: 'busy' with a retry delay, and the browser reconnects.
+    """
+    user_data = get_user_financials(session_id)
+    if not user_data:
+        return jsonify({'error': 'Session not found'}), 404
+    # The exchange posted to /advisor is in the session state; query parameters override it
+    exchange = session_state.get(session_id, 'advisor') or {}
+    question = request.args.get('question', exchange.get('question', ''))
+    answer = request.args.get('answer', exchange.get('answer', ''))
+    stored = stored_suggestions(session_id, question, answer)
+    prompt = build_suggestion_prompt(user_data, question, answer)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    if not stored and not advisor_stream_slots.acquire(blocking=False):
+        busy = f"retry: {ADVISOR_STREAM_RETRY_MS}\nevent: busy\ndata: {{}}\n\n"
+        return Response(busy, mimetype='text/event-stream', headers=headers)
+    released = threading.Event()
+
+    def release_slot():
+        # Called when the stream ends and again when the server closes the response
+        if not stored and not released.is_set():
+            released.set()
+            advisor_stream_slots.release()
+
+    def events():
+        if stored:
+            yield f"data: {json.dumps({'text': stored})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+        chunks = []
+        try:
+            for chunk in gemini_client.stream_text(prompt):
+                chunks.append(chunk)
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+        except gemini_client.GeminiError as e:
+            logger.error(f"Gemini stream failed: {e}")
+            if not chunks:
+                yield f"data: {json.dumps({'text': SUGGESTIONS_FALLBACK})}\n\n"
+            # Log what was shown, but don't keep a cut-off answer for reloads to replay
+            log_conversation(session_id, question, answer, ''.join(chunks) or None)
+        else:
+            save_suggestions(session_id, question, answer, ''.join(chunks) or None)
+        finally:
+            # Free the slot as soon as Gemini is done, not when the server gets round to closing
+            release_slot()
+        yield "event: done\ndata: {}\n\n"
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+    # Covers a client that left before the first chunk, when events() never ran
+    response.call_on_close(release_slot)
+    return response
+
 if __name__ == '__main__':
     # Validate environment variables
     required_vars = ['DB_URL']
@@ -434,5 +726,9 @@ if __name__ == '__main__':
         logger.info("Database connection successful")
     else:
         logger.warning("Database connection failed - check your DB_URL")
+
+    import prewarm
+    if prewarm.PREWARM:
+        prewarm.prewarm(extraction_pipeline, monitor=health_monitor)
     
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
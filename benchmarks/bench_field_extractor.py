@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rule-based field extraction accuracy and latency.
+Each benchmarks/corpus/fields/<name>.txt is a document's extracted text and
+<name>.json the expected annual UserFinancials fields (null when the rules
+should decline and leave the document to Gemini). Accepted documents are also
+timed through extraction.extract_structured_data, the entry point the upload
+pipeline calls (caches disabled, so no Gemini round-trip is involved).
+
+Usage: python benchmarks/bench_field_extractor.py [--repeat 1000] [--json out.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('LLM_CACHE_ENABLED', '0')
+os.environ.setdefault('TEXT_CACHE_ENABLED', '0')
+import field_extractor  # noqa: E402
+import extraction  # noqa: E402
+from benchmarks import results  # noqa: E402
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'corpus', 'fields')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule-based field extractor benchmark")
+    parser.add_argument('--repeat', type=int, default=1000)
+    parser.add_argument('--json', help="also write results as JSON to this path ('-' for stdout)")
+    args = parser.parse_args()
+
+    total_fields = correct_fields = wrong_decisions = 0
+    documents = {}
+    print(f"{'document':<24} {'layout':<8} {'conf':>5} {'accepted':>8} {'fields':>7} {'us/doc':>8} {'us/full':>8}")
+    for path in sorted(glob.glob(os.path.join(CORPUS, '*.txt'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            text = f.read()
+        with open(os.path.splitext(path)[0] + '.json') as f:
+            expected = json.load(f)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = field_extractor.extract_fields(text)
+        micros = (time.perf_counter() - start) / args.repeat * 1e6
+
+        accepted = result.confidence >= field_extractor.MIN_CONFIDENCE
+        full_micros = None
+        if accepted:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                extraction.extract_structured_data(text)
+            full_micros = (time.perf_counter() - start) / args.repeat * 1e6
+        if expected is None:
+            wrong_decisions += accepted
+            score = '-'
+        else:
+            wrong_decisions += not accepted
+            hits = sum(1 for k, v in expected.items() if abs(result.fields.get(k, 0) - v) < 0.5)
+            total_fields += len(expected)
+            correct_fields += hits
+            score = f"{hits}/{len(expected)}"
+        full = f"{full_micros:>8.1f}" if full_micros is not None else f"{'-':>8}"
+        print(f"{name:<24} {str(result.layout):<8} {result.confidence:>5.2f} {str(accepted):>8} {score:>7} {micros:>8.1f} {full}")
+        documents[name] = {
+            'confidence': result.confidence, 'accepted': accepted, 'fields': score,
+            'extract_fields_us': round(micros, 2),
+            'extract_structured_data_us': round(full_micros, 2) if full_micros is not None else None,
+        }
+
+    accuracy = correct_fields / total_fields if total_fields else 0.0
+    print(f"\nfield accuracy: {accuracy:.1%}   wrong accept/fallback decisions: {wrong_decisions}")
+    if args.json:
+        documents['accuracy'] = {'field_accuracy': round(accuracy, 4), 'wrong_decisions': wrong_decisions}
+        results.write_json(args.json, 'field_extractor', documents)
+    return 0 if wrong_decisions == 0 and accuracy == 1.0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
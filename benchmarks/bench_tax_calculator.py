@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scalar vs vectorized tax computation.
+Generates a synthetic payroll roster, checks calculate_batch against the
+scalar functions row by row and reports rows/second for both paths.
+
+Usage: python benchmarks/bench_tax_calculator.py [--rows 200000] [--seed 7] [--json out.json]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tax_calculator  # noqa: E402
+from benchmarks import results  # noqa: E402
+
+
+def synthetic_roster(rows, seed):
+    """Random but plausible annual UserFinancials columns."""
+    rng = np.random.default_rng(seed)
+    gross = rng.uniform(0, 4_000_000, rows).round(2)
+    return {
+        'gross_salary': gross,
+        'basic_salary': (gross * 0.4).round(2),
+        'hra_received': (gross * 0.2).round(2),
+        'rent_paid': rng.uniform(0, 600_000, rows).round(2),
+        'deduction_80c': rng.uniform(0, 150_000, rows).round(2),
+        'deduction_80d': rng.uniform(0, 50_000, rows).round(2),
+        'standard_deduction': np.full(rows, 50_000.0),
+        'professional_tax': rng.choice([0.0, 2400.0, 2500.0], rows),
+        'tds': (gross * 0.1).round(2),
+    }
+
+
+def scalar_pass(rows_as_dicts):
+    out = []
+    for row in rows_as_dicts:
+        net_old = tax_calculator.get_net_taxable_income_old(row)
+        net_new = tax_calculator.get_net_taxable_income_new(row)
+        out.append((tax_calculator.calculate_old_regime_tax(net_old),
+                    tax_calculator.calculate_new_regime_tax(net_new)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help="also write results as JSON to this path ('-' for stdout)")
+    args = parser.parse_args()
+
+    table = synthetic_roster(args.rows, args.seed)
+    rows_as_dicts = [
+        {field: str(table[field][i]) for field in tax_calculator.FINANCIAL_FIELDS}
+        for i in range(args.rows)
+    ]
+
+    start = time.perf_counter()
+    scalar = scalar_pass(rows_as_dicts)
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = tax_calculator.calculate_batch(table)
+    batch_s = time.perf_counter() - start
+
+    expected_old = np.array([old for old, _ in scalar])
+    expected_new = np.array([new for _, new in scalar])
+    mismatches = int(np.count_nonzero(batch['total_old'] != expected_old) +
+                     np.count_nonzero(batch['total_new'] != expected_new))
+
+    print(f"rows:            {args.rows}")
+    print(f"scalar:          {scalar_s:.3f}s ({args.rows / scalar_s:,.0f} rows/s)")
+    print(f"batch:           {batch_s:.3f}s ({args.rows / batch_s:,.0f} rows/s)")
+    print(f"speedup:         {scalar_s / batch_s:.1f}x")
+    print(f"exact mismatches: {mismatches}")
+    if args.json:
+        results.write_json(args.json, 'tax_calculator', {
+            'scalar': {'rows': args.rows, 'seconds': round(scalar_s, 4),
+                       'throughput_rows_per_s': round(args.rows / scalar_s, 1)},
+            'batch': {'rows': args.rows, 'seconds': round(batch_s, 4),
+                      'throughput_rows_per_s': round(args.rows / batch_s, 1)},
+            'accuracy': {'exact_mismatches': mismatches},
+        })
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Checks of the Gemini client's retries and circuit breaker against the stub
+server (benchmarks/stub_gemini.py): retries with backoff on 5xx, the
+closed -> open -> half-open -> closed/open transitions, that an open breaker
+fails fast without queueing for a concurrency slot, and that a half-open
+trial is always resolved, including when the call gives up waiting for a
+concurrency slot or fails in an unexpected way. Also that a stream cut off
+part way surfaces as GeminiError and counts against the breaker.
+
+Usage: python benchmarks/check_gemini_client.py
+"""
+
+import os
+import sys
+import time
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks import stub_gemini  # noqa: E402
+
+THRESHOLD = 3
+RESET_TIMEOUT = 0.2
+
+
+def setup():
+    server = stub_gemini.serve(port=0)
+    os.environ['GEMINI_API_KEY'] = 'stub'
+    import gemini_client
+    gemini_client.GEMINI_ENDPOINT = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/stub"
+    gemini_client.BACKOFF_BASE = 0.001
+    gemini_client.BACKOFF_MAX = 0.001
+    gemini_client.QUEUE_TIMEOUT = 0.05
+    return gemini_client
+
+
+def fresh_breaker(client):
+    client.breaker = client.CircuitBreaker(failure_threshold=THRESHOLD, reset_timeout=RESET_TIMEOUT)
+    return client.breaker
+
+
+def stub_requests():
+    with stub_gemini.StubConfig.lock:
+        return stub_gemini.StubConfig.requests
+
+
+def failing(rate):
+    stub_gemini.StubConfig.failure_rate = rate
+
+
+def call(client):
+    """One generate_content call: 'ok', 'error' or 'short_circuited'."""
+    try:
+        client.generate_content('ping')
+        return 'ok'
+    except client.CircuitOpenError:
+        return 'short_circuited'
+    except client.GeminiError:
+        return 'error'
+
+
+def trip(client, breaker):
+    failing(1.0)
+    for _ in range(THRESHOLD):
+        call(client)
+    failing(0.0)
+    return breaker.state
+
+
+def check_retries(client):
+    fresh_breaker(client)
+    failing(1.0)
+    before = stub_requests()
+    outcome = call(client)
+    sent = stub_requests() - before
+    failing(0.0)
+    expected = client.MAX_RETRIES + 1
+    failures = []
+    if outcome != 'error' or sent != expected:
+        failures.append(f"5xx: expected {expected} attempts ending in error, got {sent} ending in {outcome}")
+    before = stub_requests()
+    if call(client) != 'ok' or stub_requests() - before != 1:
+        failures.append("healthy stub: expected a single successful attempt")
+    return failures
+
+
+def check_transitions(client):
+    failures = []
+    breaker = fresh_breaker(client)
+    if breaker.state != 'closed':
+        failures.append(f"new breaker is {breaker.state}")
+    state = trip(client, breaker)
+    if state != 'open':
+        failures.append(f"after {THRESHOLD} failed calls the breaker is {state}, expected open")
+    before = stub_requests()
+    if call(client) != 'short_circuited' or stub_requests() != before:
+        failures.append("open breaker let a request through")
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    if breaker.state != 'half-open':
+        failures.append(f"after the reset timeout the breaker is {breaker.state}, expected half-open")
+    failing(1.0)
+    call(client)
+    failing(0.0)
+    if breaker.state != 'open':
+        failures.append(f"failed trial left the breaker {breaker.state}, expected open")
+
+    time.sleep(RESET_TIMEOUT * 1.5)
+    if call(client) != 'ok' or breaker.state != 'closed':
+        failures.append(f"successful trial left the breaker {breaker.state}, expected closed")
+    return failures
+
+
+def check_open_fails_fast(client):
+    """An open breaker refuses at once, even when every concurrency slot is taken."""
+    breaker = fresh_breaker(client)
+    trip(client, breaker)
+    held = 0
+    while client._slots.acquire(blocking=False):
+        held += 1
+    queue_timeout, client.QUEUE_TIMEOUT = client.QUEUE_TIMEOUT, 1.0
+    try:
+        start = time.perf_counter()
+        outcome = call(client)
+        elapsed = time.perf_counter() - start
+    finally:
+        client.QUEUE_TIMEOUT = queue_timeout
+        for _ in range(held):
+            client._slots.release()
+    if outcome != 'short_circuited' or elapsed > 0.2:
+        return [f"open breaker with no free slot: {outcome} after {elapsed:.2f}s, expected an immediate short circuit"]
+    return []
+
+
+def check_trial_resolved_on_queue_timeout(client):
+    """A half-open call that cannot get a slot must not hold the trial."""
+    breaker = fresh_breaker(client)
+    trip(client, breaker)
+    time.sleep(RESET_TIMEOUT * 1.5)
+    held = 0
+    while client._slots.acquire(blocking=False):
+        held += 1
+    try:
+        call(client)
+    finally:
+        for _ in range(held):
+            client._slots.release()
+    if call(client) != 'ok' or breaker.state != 'closed':
+        return [f"after a queue timeout in half-open the breaker is stuck {breaker.state}"]
+    return []
+
+
+def check_trial_resolved_on_unexpected_error(client):
+    """A half-open call failing outside the retry loop's expected errors reopens the breaker."""
+    breaker = fresh_breaker(client)
+    trip(client, breaker)
+    time.sleep(RESET_TIMEOUT * 1.5)
+    try:
+        client._post('generateContent', {'contents': object()})     # not JSON serializable
+    except client.GeminiError:
+        pass
+    except Exception as e:
+        return [f"unexpected error escaped as {type(e).__name__}, expected GeminiError"]
+    failures = []
+    if breaker.state != 'open':
+        failures.append(f"unexpected error in half-open left the breaker {breaker.state}, expected open")
+    time.sleep(RESET_TIMEOUT * 1.5)
+    if call(client) != 'ok' or breaker.state != 'closed':
+        failures.append(f"breaker did not recover after an unexpected error: {breaker.state}")
+    return failures
+
+
+def check_concurrent_trial(client):
+    """Only one request reaches the stub while half-open."""
+    breaker = fresh_breaker(client)
+    trip(client, breaker)
+    time.sleep(RESET_TIMEOUT * 1.5)
+    stub_gemini.StubConfig.latency = 0.1
+    before = stub_requests()
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(call(client))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stub_gemini.StubConfig.latency = 0.0
+    sent = stub_requests() - before
+    if sent != 1 or outcomes.count('ok') != 1:
+        return [f"half-open: {sent} requests sent, outcomes {sorted(outcomes)}; expected one trial"]
+    return []
+
+
+def check_stream_dropped(client):
+    """An upstream drop mid-stream raises GeminiError after the chunks received so far."""
+    breaker = fresh_breaker(client)
+    stub_gemini.StubConfig.drop_stream_after = 1
+    chunks, error = [], None
+    try:
+        for chunk in client.stream_text('advice please'):
+            chunks.append(chunk)
+    except Exception as e:
+        error = e
+    finally:
+        stub_gemini.StubConfig.drop_stream_after = None
+    failures = []
+    if not isinstance(error, client.GeminiError):
+        failures.append(f"dropped stream raised {type(error).__name__}, expected GeminiError")
+    if len(chunks) != 1:
+        failures.append(f"expected the 1 chunk sent before the drop, got {len(chunks)}")
+    if breaker._failures != 1:
+        failures.append(f"dropped stream recorded {breaker._failures} breaker failures, expected 1")
+    if not client._slots.acquire(timeout=0.5):
+        failures.append("dropped stream did not release its concurrency slot")
+    else:
+        client._slots.release()
+    return failures
+
+
+CHECKS = (
+    check_retries,
+    check_transitions,
+    check_open_fails_fast,
+    check_trial_resolved_on_queue_timeout,
+    check_trial_resolved_on_unexpected_error,
+    check_concurrent_trial,
+    check_stream_dropped,
+)
+
+
+def main():
+    client = setup()
+    failures = 0
+    for check in CHECKS:
+        problems = check(client)
+        failures += len(problems)
+        print(f"{'FAIL' if problems else 'ok  '} {check.__name__}")
+        for problem in problems:
+            print(f"     {problem}")
+    print(f"failures: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the web app. Runs `python -X importtime -c "import app"`
+in a fresh interpreter, reports the total and the slowest top-level imports,
+and fails when the total exceeds the budget or when a lazily loaded stack
+(PDF, OCR, HTTP client) was imported at module load.
+
+Usage: python benchmarks/check_import_time.py [--budget-ms 200] [--repeat 3] [--top 15] [--json out.json]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks import results  # noqa: E402
+
+# Loaded on first use (extraction.py, gemini_client.py) or by prewarm.py, never by `import app`.
+LAZY_MODULES = ('PyPDF2', 'pytesseract', 'pdf2image', 'requests')
+
+PROBE = (
+    "import sys, app\n"
+    f"print('LOADED', ','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+def measure():
+    """
+    One cold `import app`: (total us, {top-level package: self us}, lazy modules loaded).
+    -X importtime prints each import after its children, indented two spaces
+    per level, so the lines between the previous top-level import and `app`
+    are everything app pulled in.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{proc.stderr[-2000:]}")
+    block, total = [], None
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_us, cumulative_us, raw_name = line[len('import time:'):].split('|')
+        name = raw_name.strip()
+        if raw_name.startswith('  '):
+            block.append((name, int(self_us)))
+        elif name == 'app':
+            block.append((name, int(self_us)))
+            total = int(cumulative_us)
+            break
+        else:
+            block = []
+    packages = {}
+    for name, self_us in block:
+        package = name.split('.', 1)[0]
+        packages[package] = packages.get(package, 0) + self_us
+    loaded = next((l.split(' ', 1)[1] for l in proc.stdout.splitlines() if l.startswith('LOADED')), '')
+    return total, packages, [m for m in loaded.split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the web app")
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_BUDGET_MS', '200')))
+    parser.add_argument('--repeat', type=int, default=3, help="cold imports to run; the fastest counts")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', help="also write results as JSON to this path ('-' for stdout)")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    total, breakdown, loaded = min(runs, key=lambda run: run[0])
+    total_ms = total / 1000
+
+    print(f"import app: {total_ms:.1f} ms (best of {args.repeat}, budget {args.budget_ms:.0f} ms)")
+    print(f"\n{'package':<36} {'self ms':>14}")
+    for name, us in sorted(breakdown.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{name:<36} {us / 1000:>14.1f}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if loaded:
+        failures.append(f"lazily loaded modules imported by `import app`: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if args.json:
+        results.write_json(args.json, 'import_time', {
+            'import_app': {'total_ms': round(total_ms, 1), 'budget_ms': args.budget_ms,
+                           'eager_lazy_modules': loaded, 'errors': len(failures)},
+            'modules_ms': {name: round(us / 1000, 1) for name, us in breakdown.items()},
+        })
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Checks that SessionStore.update keeps fields written by other workers: two
+stores share one SQLite file (as two gunicorn workers do), one holding a
+stale copy in its memory tier, and their updates to the same session are
+interleaved, then run concurrently from several threads each.
+
+Usage: python benchmarks/check_session_store.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from cache import SQLiteCache  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+THREADS = 4
+UPDATES = 50
+
+
+def worker_stores(path, count=2):
+    """`count` stores over one SQLite file, each with its own connections and memory tier."""
+    return [SessionStore(SQLiteCache(path, table='session_state'), memory_ttl=60) for _ in range(count)]
+
+
+def check_interleaved_updates(path):
+    a, b = worker_stores(path)
+    a.update('s1', upload_job_id='job-1')
+    b.get('s1')                         # b now holds {upload_job_id} in memory
+    a.update('s1', extracted={'gross_salary': 1000000})
+    b.update('s1', results={'tax_new_regime': 1})
+    a.update('s1', advisor_question='What are your goals?')
+    problems = []
+    expected = {'upload_job_id', 'extracted', 'results', 'advisor_question'}
+    for name, store in (('a', a), ('b', b)):
+        missing = expected - set(store.get('s1', fresh=True))
+        if missing:
+            problems.append(f"store {name} lost {sorted(missing)}")
+    return problems
+
+
+def check_concurrent_updates(path):
+    stores = worker_stores(path)
+
+    def run(store, n):
+        for i in range(UPDATES):
+            store.update('s2', **{f"t{n}_{i}": i})
+
+    threads = [threading.Thread(target=run, args=(stores[n % 2], n)) for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    state = stores[0].get('s2', fresh=True)
+    lost = THREADS * UPDATES - len(state)
+    return [f"{lost} of {THREADS * UPDATES} fields lost"] if lost else []
+
+
+CHECKS = (
+    check_interleaved_updates,
+    check_concurrent_updates,
+)
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for check in CHECKS:
+            problems = check(os.path.join(tmp, f"{check.__name__}.sqlite3"))
+            failures += len(problems)
+            print(f"{'FAIL' if problems else 'ok  '} {check.__name__}")
+            for problem in problems:
+                print(f"     {problem}")
+    print(f"failures: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
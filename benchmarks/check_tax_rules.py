@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Check of the tax rules: slabs, 87A rebate, surcharge and HRA exemption.
+Compares the scalar calculator against hand-worked examples for every
+assessment year, taken at and just past each 87A and surcharge threshold
+(marginal relief included); none of the expected values is derived from
+tax_calculator's tables. Then checks, on random profiles concentrated around
+every threshold, that the batch path matches the scalar one, that the bulk
+roster path (bulk.compute_chunk) matches it on metro and non-metro rows, and
+that the total tax never falls as income rises.
+
+Usage: python benchmarks/check_tax_rules.py [--cases 20000] [--seed 7]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bulk  # noqa: E402
+import tax_calculator  # noqa: E402
+
+TOLERANCE = 1e-6
+
+
+# ---------------------------------------------------------------------------
+# Hand-worked examples
+# ---------------------------------------------------------------------------
+
+# (regime, assessment year, net taxable income, total tax including 4% cess).
+# Working: slab tax, then 87A rebate / marginal relief, then surcharge with
+# marginal relief, then x 1.04.
+WORKED_EXAMPLES = (
+    # Old regime: 0 / 5% / 20% / 30% from 2.5L / 5L / 10L; 87A up to 12,500 at <= 5L, no relief.
+    ('old', '2025-26', 0, 0),
+    ('old', '2025-26', 300000, 0),                  # 2,500 slab tax, fully rebated
+    ('old', '2025-26', 500000, 0),                  # 12,500, fully rebated
+    ('old', '2025-26', 510000, 15080),              # 12,500 + 2,000 = 14,500, no rebate
+    ('old', '2025-26', 1000000, 117000),            # 12,500 + 1,00,000 = 1,12,500
+    ('old', '2025-26', 5000000, 1365000),           # 1,12,500 + 12,00,000 = 13,12,500, no surcharge yet
+    ('old', '2025-26', 5010000, 1375400),           # 13,15,500 x 1.10 capped at 13,12,500 + 10,000
+    ('old', '2025-26', 6000000, 1844700),           # 16,12,500 x 1.10 = 17,73,750
+    ('old', '2025-26', 10000000, 3217500),          # 28,12,500 x 1.10 = 30,93,750
+    ('old', '2025-26', 10010000, 3227900),          # 28,15,500 x 1.15 capped at 30,93,750 + 10,000
+    ('old', '2025-26', 50000000, 19256250),         # 1,48,12,500 x 1.25 = 1,85,15,625
+    ('old', '2025-26', 50100000, 19360250),         # 1,48,42,500 x 1.37 capped at 1,85,15,625 + 1,00,000
+    ('old', '2026-27', 500000, 0),
+    ('old', '2026-27', 510000, 15080),
+    # New regime AY 2025-26: 5% / 10% / 15% / 20% / 30% from 3L / 6L / 9L / 12L / 15L;
+    # 87A up to 25,000 at <= 7L with marginal relief; surcharge capped at 25%.
+    ('new', '2025-26', 700000, 0),                  # 25,000, fully rebated
+    ('new', '2025-26', 710000, 10400),              # 26,000 capped at the 10,000 above 7L
+    ('new', '2025-26', 720000, 20800),              # 27,000 capped at 20,000
+    ('new', '2025-26', 750000, 31200),              # 30,000, under the 50,000 cap
+    ('new', '2025-26', 1500000, 156000),            # 15,000 + 30,000 + 45,000 + 60,000
+    ('new', '2025-26', 5010000, 1258400),           # 12,03,000 x 1.10 capped at 12,00,000 + 10,000
+    ('new', '2025-26', 20010000, 6827600),          # 57,03,000 x 1.25 capped at 57,00,000 x 1.15 + 10,000
+    ('new', '2025-26', 50100000, 19149000),         # 1,47,30,000 x 1.25, no 37% band
+    # New regime AY 2026-27: 5% steps from 4L up to 30% above 24L; 87A up to 60,000 at <= 12L.
+    ('new', '2026-27', 1200000, 0),                 # 20,000 + 40,000, fully rebated
+    ('new', '2026-27', 1210000, 10400),             # 61,500 capped at the 10,000 above 12L
+    ('new', '2026-27', 1275000, 74100),             # 71,250, under the 75,000 cap
+    ('new', '2026-27', 2400000, 312000),            # 20,000 + 40,000 + 60,000 + 80,000 + 1,00,000
+    ('new', '2026-27', 5010000, 1133600),           # 10,83,000 x 1.10 capped at 10,80,000 + 10,000
+)
+
+# (basic salary, HRA received, rent paid, metro, exempt HRA): least of HRA received,
+# rent less 10% of basic, and 50% (metro) / 40% of basic.
+HRA_EXAMPLES = (
+    (500000, 240000, 300000, True, 240000),         # HRA received is least
+    (500000, 240000, 300000, False, 200000),        # 40% of basic is least
+    (600000, 400000, 330000, True, 270000),         # rent less 10% of basic is least
+    (600000, 400000, 40000, True, 0),               # rent below 10% of basic
+    (600000, 400000, 0, False, 0),                  # no rent paid
+)
+
+
+def check_worked_examples():
+    failures = 0
+    for regime, year, income, expected in WORKED_EXAMPLES:
+        total = tax_calculator.calculate_tax(float(income), regime, year)
+        if not close(total, expected):
+            failures += 1
+            print(f"FAIL {regime} {year} income={income}: {total} != worked example {expected}")
+    for basic, hra, rent, metro, expected in HRA_EXAMPLES:
+        exempt = tax_calculator.hra_exemption(float(basic), float(hra), float(rent), metro=metro)
+        if not close(exempt, expected):
+            failures += 1
+            print(f"FAIL hra basic={basic} hra={hra} rent={rent} metro={metro}: {exempt} != {expected}")
+    return failures
+
+
+# ---------------------------------------------------------------------------
+# Case generation
+# ---------------------------------------------------------------------------
+
+def thresholds():
+    points = set()
+    for (regime, year), slabs in tax_calculator._SLAB_DEFINITIONS.items():
+        points.update(lower for lower, _ in slabs)
+        points.add(tax_calculator._REBATE_87A[(regime, year)][0])
+        points.update(lower for lower, _ in tax_calculator._SURCHARGE_BANDS[regime])
+    return sorted(p for p in points if p)
+
+
+def random_incomes(rng, cases):
+    """Half spread over 0-70M, half within +/-2,000 of a threshold."""
+    spread = rng.uniform(0, 70_000_000, cases // 2)
+    near = rng.choice(thresholds(), cases - cases // 2) + rng.uniform(-2000, 2000, cases - cases // 2)
+    return np.maximum(0.0, np.concatenate([spread, near]).round(2))
+
+
+def close(a, b):
+    return abs(a - b) <= TOLERANCE * max(1.0, abs(b))
+
+
+def check_regimes(rng, cases):
+    failures = 0
+    incomes = random_incomes(rng, cases)
+    for year in tax_calculator.available_assessment_years():
+        for regime in ('old', 'new'):
+            schedule = tax_calculator.get_slab_schedule(regime, year)
+            batch, _, _ = tax_calculator.income_tax_batch(incomes, schedule)
+            totals = []
+            for i, income in enumerate(incomes):
+                income = float(income)
+                scalar = tax_calculator.calculate_tax(income, regime, year)
+                if batch[i] != tax_calculator.income_tax(income, schedule):
+                    failures += 1
+                    print(f"FAIL {regime} {year} income={income}: batch {batch[i]} != scalar")
+                totals.append((income, scalar))
+            totals.sort()
+            for (lo, tax_lo), (hi, tax_hi) in zip(totals, totals[1:]):
+                if tax_hi < tax_lo - TOLERANCE * max(1.0, tax_lo):
+                    failures += 1
+                    print(f"FAIL {regime} {year}: tax falls from {tax_lo} at {lo} to {tax_hi} at {hi}")
+    return failures
+
+
+def random_profiles(rng, cases):
+    basic = rng.uniform(0, 3_000_000, cases).round(2)
+    return {
+        'gross_salary': (basic * rng.uniform(1.5, 3, cases)).round(2),
+        'basic_salary': basic,
+        'hra_received': (basic * rng.uniform(0, 0.6, cases)).round(2),
+        'rent_paid': rng.uniform(0, 1_500_000, cases).round(2),
+        'deduction_80c': rng.uniform(0, 150_000, cases).round(2),
+        'standard_deduction': np.full(cases, 50_000.0),
+        'metro': rng.integers(0, 2, cases).astype(np.float64),
+    }
+
+
+def check_hra(rng, cases):
+    failures = 0
+    table = random_profiles(rng, cases)
+    batch = tax_calculator.hra_exemption_batch(tax_calculator.to_columns(table))
+    for i in range(cases):
+        args = (float(table['basic_salary'][i]), float(table['hra_received'][i]), float(table['rent_paid'][i]))
+        metro = bool(table['metro'][i])
+        scalar = tax_calculator.hra_exemption(*args, metro=metro)
+        if batch[i] != scalar:
+            failures += 1
+            print(f"FAIL hra {args} metro={metro}: batch {batch[i]} != scalar {scalar}")
+    return failures
+
+
+def check_bulk(rng, cases):
+    """bulk.compute_chunk on CSV-style rows (metro as form/CSV text) against the scalar calculator."""
+    failures = 0
+    table = random_profiles(rng, cases)
+    metro_text = rng.choice(['1', 'yes', 'Metro', 'true', '0', 'no', ''], cases)
+    rows = [
+        dict({field: f"{values[i]:.2f}" for field, values in table.items() if field != 'metro'},
+             metro=str(metro_text[i]))
+        for i in range(cases)
+    ]
+    for row in bulk.compute_chunk(rows):
+        expected = (
+            round(tax_calculator.calculate_old_regime_tax(tax_calculator.get_net_taxable_income_old(row)), 2),
+            round(tax_calculator.calculate_new_regime_tax(tax_calculator.get_net_taxable_income_new(row)), 2),
+        )
+        got = (row['tax_old_regime'], row['tax_new_regime'])
+        if not (close(got[0], expected[0]) and close(got[1], expected[1])):
+            failures += 1
+            print(f"FAIL bulk metro={row['metro']!r} basic={row['basic_salary']}: {got} != scalar {expected}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failures = (check_worked_examples() + check_regimes(rng, args.cases)
+                + check_hra(rng, args.cases) + check_bulk(rng, args.cases))
+    print(f"cases:    {len(WORKED_EXAMPLES)} worked examples, {args.cases} per regime and year, "
+          f"{args.cases} HRA, {args.cases} bulk rows")
+    print(f"failures: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark JSON files (see benchmarks/results.py) from the same
+suite, e.g. the base branch against a change, and flag regressions.
+Latencies and durations (*_ms, *_us, seconds) should not rise, throughputs
+(*_rps, *_per_s) should not fall, and error counts should not grow.
+
+Usage: python benchmarks/compare.py base.json change.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ('_ms', '_us', 'seconds', 'errors', 'mismatches', 'wrong_decisions')
+HIGHER_IS_BETTER = ('_rps', '_per_s', 'accuracy')
+
+
+def direction(metric):
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def flatten(results, prefix=''):
+    """{'calculate': {'p50_ms': 6.1}} -> {'calculate.p50_ms': 6.1}, numeric values only."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('base')
+    parser.add_argument('change')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.change) as f:
+        change = json.load(f)
+    if base['suite'] != change['suite']:
+        print(f"suites differ: {base['suite']} vs {change['suite']}", file=sys.stderr)
+        return 2
+
+    before, after = flatten(base['results']), flatten(change['results'])
+    print(f"suite {base['suite']}: {base['meta'].get('git_revision')} -> {change['meta'].get('git_revision')}")
+    print(f"{'metric':<44} {'base':>12} {'change':>12} {'delta':>9}")
+    regressions = 0
+    for metric in sorted(before.keys() & after.keys()):
+        sense = direction(metric.rsplit('.', 1)[-1])
+        if not sense:
+            continue
+        old, new = before[metric], after[metric]
+        delta = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+        worse = delta * sense < -args.threshold if old else (new - old) * sense < 0
+        regressions += worse
+        flag = '  REGRESSION' if worse else ''
+        print(f"{metric:<44} {old:>12.3f} {new:>12.3f} {delta:>+8.1f}%{flag}")
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0f}%")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Build the synthetic salary-slip PDF corpus for the upload benchmarks.
+Every benchmarks/corpus/fields/<name>.txt becomes:
+- <name>_text.pdf     a PDF with a real text layer (Helvetica), for the PyPDF2 path
+- <name>_scanned.pdf  the same text rendered to a 200 dpi grayscale image, for OCR
+- <name>_mixed.pdf    a text page followed by a scanned page
+in benchmarks/corpus/pdf/, plus manifest.json with each file's expected fields.
+Output is deterministic, so the files are generated rather than committed.
+
+Usage: python benchmarks/make_pdf_corpus.py [--out benchmarks/corpus/pdf]
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+
+import PyPDF2
+from PIL import Image, ImageDraw, ImageFont
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIELDS_CORPUS = os.path.join(ROOT, 'benchmarks', 'corpus', 'fields')
+DEFAULT_OUT = os.path.join(ROOT, 'benchmarks', 'corpus', 'pdf')
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792    # US Letter in points
+SCAN_DPI = 200
+
+
+def _pdf_string(line):
+    line = line.replace('₹', 'Rs.').encode('latin-1', 'replace').decode('latin-1')
+    return '(' + line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def text_pdf(text):
+    """A one-page PDF whose content stream draws `text` line by line in Helvetica."""
+    ops = ['BT', '/F1 10 Tf', '12 TL', '50 750 Td']
+    ops += [f"{_pdf_string(line)} Tj T*" for line in text.splitlines()]
+    ops.append('ET')
+    content = '\n'.join(ops).encode('latin-1')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT),
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def scanned_pdf(text):
+    """A one-page image-only PDF: `text` rendered onto a grayscale page scan."""
+    scale = SCAN_DPI / 72
+    image = Image.new('L', (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=int(10 * scale))
+    except TypeError:   # Pillow < 10.1 has only the small bitmap font
+        font = ImageFont.load_default()
+    y = int(42 * scale)
+    for line in text.splitlines():
+        draw.text((int(50 * scale), y), line.replace('₹', 'Rs.'), fill=0, font=font)
+        y += int(12 * scale)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PDF', resolution=SCAN_DPI)
+    return buffer.getvalue()
+
+
+def merge(*documents):
+    writer = PyPDF2.PdfWriter()
+    for document in documents:
+        for page in PyPDF2.PdfReader(io.BytesIO(document)).pages:
+            writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def build(out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for path in sorted(glob.glob(os.path.join(FIELDS_CORPUS, '*.txt'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            text = f.read()
+        with open(os.path.splitext(path)[0] + '.json') as f:
+            expected = json.load(f)
+        variants = {
+            'text': text_pdf(text),
+            'scanned': scanned_pdf(text),
+        }
+        variants['mixed'] = merge(variants['text'], variants['scanned'])
+        for kind, data in variants.items():
+            filename = f"{name}_{kind}.pdf"
+            with open(os.path.join(out_dir, filename), 'wb') as f:
+                f.write(data)
+            manifest[filename] = {'source': name, 'kind': kind, 'bytes': len(data), 'expected': expected}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the synthetic PDF corpus")
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args()
+    manifest = build(args.out)
+    for filename, entry in manifest.items():
+        print(f"{filename:<32} {entry['kind']:<8} {entry['bytes']:>9,} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
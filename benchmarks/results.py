@@ -0,0 +1,62 @@
+"""
+Machine-readable benchmark output shared by the scripts in benchmarks/.
+Every script accepts --json PATH and writes one document:
+    {"suite": ..., "meta": {git revision, python, platform, cpus, time}, "results": {...}}
+benchmarks/compare.py diffs two such files.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def latency_summary(latencies, elapsed=None):
+    """p50/p95/p99/mean in milliseconds (and req/s when `elapsed` is given) for a list of seconds."""
+    if not latencies:
+        return {'count': 0}
+    ordered = sorted(latencies)
+    pct = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+    summary = {
+        'count': len(ordered),
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(ordered) / elapsed, 1)
+    return summary
+
+
+def write_json(path, suite, results):
+    """Write `results` (a dict of metric dicts) with run metadata to `path` ('-' for stdout)."""
+    document = {
+        'suite': suite,
+        'meta': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+    if path == '-':
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
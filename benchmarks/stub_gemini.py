@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent API.
+Injects latency and failures so the client's retries, timeouts and circuit
+breaker can be exercised without the real service.
+
+Usage: python benchmarks/stub_gemini.py [--port 8765] [--latency 0.5] [--failure-rate 0.2]
+Then:  GEMINI_ENDPOINT=http://127.0.0.1:8765/v1beta/models/stub python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXTRACTION_ANSWER = {
+    'gross_salary': 1200000, 'basic_salary': 600000, 'hra_received': 240000,
+    'rent_paid': 0, 'deduction_80c': 150000, 'deduction_80d': 25000,
+    'standard_deduction': 50000, 'professional_tax': 2400, 'tds': 96000,
+}
+ADVICE_ANSWER = (
+    "- Invest the remaining Section 80C limit in ELSS or PPF.\n"
+    "- Buy health insurance for yourself and your parents to claim Section 80D.\n"
+    "- Submit rent receipts to your employer to claim HRA exemption."
+)
+
+
+class StubConfig:
+    latency = 0.0
+    jitter = 0.0
+    failure_rate = 0.0
+    failure_status = 503
+    drop_stream_after = None    # chunks sent before a stream is cut off without its terminator
+    requests = 0
+    lock = threading.Lock()
+
+
+def answer_for(prompt):
+    if 'financial data extractor' in prompt:
+        return json.dumps(EXTRACTION_ANSWER)
+    if 'ask one single' in prompt:
+        return "Are you planning any long-term investments this year?"
+    return ADVICE_ANSWER
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        """Model metadata, as used by gemini_client.ping()."""
+        self._send(200, {'name': 'models/stub', 'displayName': 'Stub Gemini'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        prompt = body.get('contents', [{}])[0].get('parts', [{}])[0].get('text', '')
+        with StubConfig.lock:
+            StubConfig.requests += 1
+
+        time.sleep(max(0.0, StubConfig.latency + random.uniform(-StubConfig.jitter, StubConfig.jitter)))
+        if random.random() < StubConfig.failure_rate:
+            self._send(StubConfig.failure_status, {'error': {'message': 'injected failure'}})
+            return
+        method = self.path.split('?')[0].rsplit(':', 1)[-1]
+        if method == 'generateContent':
+            self._send(200, {'candidates': [{'content': {'parts': [{'text': answer_for(prompt)}]}}]})
+        elif method == 'streamGenerateContent':
+            self._stream(answer_for(prompt))
+        else:
+            self._send(404, {'error': {'message': f'unknown method {self.path}'}})
+
+    def _stream(self, text):
+        """Server-sent events, one line of the answer per event, spaced by the latency."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, chunk in enumerate(text.splitlines(keepends=True)):
+            if StubConfig.drop_stream_after is not None and i >= StubConfig.drop_stream_after:
+                self.close_connection = True
+                return
+            event = {'candidates': [{'content': {'parts': [{'text': chunk}]}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(StubConfig.latency / 4)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port=8765, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503):
+    """Start the stub in a daemon thread; returns the server (call .shutdown() to stop)."""
+    StubConfig.latency = latency
+    StubConfig.jitter = jitter
+    StubConfig.failure_rate = failure_rate
+    StubConfig.failure_status = failure_status
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Gemini server")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument('--failure-status', type=int, default=503)
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, args.jitter, args.failure_rate, args.failure_status)
+    print(f"Stub Gemini listening on http://127.0.0.1:{args.port}/v1beta/models/stub")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Bulk tax computation for payroll rosters.
+Streams a CSV (or Parquet, with pyarrow installed) file of UserFinancials rows
+(plus an optional 'metro' column for the HRA exemption)
+through tax_calculator.calculate_batch in fixed-size chunks, spread across
+worker processes, and writes every input row back with both regimes'
+liabilities and the recommended regime. Memory use depends on the chunk size
+and worker count, not on the file size. With --persist each computed chunk
+is also upserted into UserFinancials in one batched statement.
+
+Usage: python bulk.py roster.csv -o results.csv [--chunk-size 10000] [--workers 4]
+                      [--persist copy|values]
+"""
+
+import os
+import io
+import csv
+import sys
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+
+import tax_calculator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Columns appended to every input row.
+RESULT_FIELDS = (
+    'net_income_old', 'tax_old_regime',
+    'net_income_new', 'tax_new_regime',
+    'recommended_regime', 'savings',
+)
+
+
+def _to_float(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        value = value.strip().replace(',', '')
+        if not value:
+            return 0.0
+    return float(value)
+
+
+def read_csv_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of row dicts from a text stream of CSV."""
+    chunk = []
+    for row in csv.DictReader(stream):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_parquet_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of row dicts from a Parquet file (requires pyarrow)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet input needs pyarrow: pip install pyarrow")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def compute_chunk(rows, assessment_year=None):
+    """Compute both regimes for a list of row dicts; returns the rows with results added."""
+    columns = {
+        field: [_to_float(row.get(field)) for row in rows]
+        for field in tax_calculator.FINANCIAL_FIELDS
+    }
+    columns['metro'] = [1.0 if tax_calculator.is_metro(row.get('metro')) else 0.0 for row in rows]
+    result = tax_calculator.calculate_batch(columns, assessment_year)
+    out = []
+    for i, row in enumerate(rows):
+        tax_old = float(result['total_old'][i])
+        tax_new = float(result['total_new'][i])
+        row = dict(row)
+        row['net_income_old'] = round(float(result['net_income_old'][i]), 2)
+        row['tax_old_regime'] = round(tax_old, 2)
+        row['net_income_new'] = round(float(result['net_income_new'][i]), 2)
+        row['tax_new_regime'] = round(tax_new, 2)
+        row['recommended_regime'] = 'old' if tax_old < tax_new else 'new'
+        row['savings'] = round(abs(tax_old - tax_new), 2)
+        out.append(row)
+    return out
+
+
+def compute_chunks(chunks, workers=1, assessment_year=None):
+    """
+    Yield computed chunks in input order. With workers > 1 chunks run on a
+    process pool, with at most 2 x workers chunks in flight at a time.
+    """
+    if workers <= 1:
+        for rows in chunks:
+            yield compute_chunk(rows, assessment_year)
+        return
+    # Workers come from a clean fork server: the web app calls this from a
+    # multi-threaded worker, where a fork could copy a lock another thread holds
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        in_flight = deque()
+        for rows in chunks:
+            in_flight.append(executor.submit(compute_chunk, rows, assessment_year))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def iter_csv_output(computed_chunks):
+    """Yield the computed rows as CSV text, one chunk at a time."""
+    writer = None
+    buffer = io.StringIO()
+    for rows in computed_chunks:
+        if writer is None and rows:
+            fieldnames = list(rows[0].keys())
+            fieldnames += [f for f in RESULT_FIELDS if f not in fieldnames]
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+        if writer is not None:
+            writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def write_parquet(computed_chunks, path):
+    """Write computed chunks to a Parquet file (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+    writer = None
+    try:
+        for rows in computed_chunks:
+            if not rows:
+                continue
+            table = pa.Table.from_pylist(rows)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def persist_chunks(computed_chunks, method='copy'):
+    """
+    Upsert each computed chunk into UserFinancials as it passes through, on one
+    pooled connection. Rows without a session_id are given one, so it also
+    appears in the output file.
+    """
+    import db_pool
+    import user_financials_store
+
+    written, seconds = 0, 0.0
+    with db_pool.get_pool().connection() as conn:
+        for rows in computed_chunks:
+            n, elapsed = user_financials_store.bulk_upsert(conn, rows, method)
+            written += n
+            seconds += elapsed
+            yield rows
+    logger.info(f"Persisted {written} rows in {seconds:.2f}s "
+                f"({written / seconds if seconds else 0:,.0f} rows/s)")
+
+
+def run(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, assessment_year=None,
+        persist=None):
+    """
+    Process a whole file; returns (rows processed, seconds). `persist` ('copy'
+    or 'values') also upserts the rows into UserFinancials.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    processed = 0
+
+    def counted(chunks):
+        nonlocal processed
+        for rows in chunks:
+            processed += len(rows)
+            yield rows
+
+    with ExitStack() as stack:
+        if input_path.endswith('.parquet'):
+            chunks = read_parquet_chunks(input_path, chunk_size)
+        else:
+            chunks = read_csv_chunks(stack.enter_context(open(input_path, newline='')), chunk_size)
+        computed = counted(compute_chunks(chunks, workers, assessment_year))
+        if persist:
+            computed = persist_chunks(computed, persist)
+        if output_path.endswith('.parquet'):
+            write_parquet(computed, output_path)
+        else:
+            out = stack.enter_context(open(output_path, 'w', newline=''))
+            for text in iter_csv_output(computed):
+                out.write(text)
+    return processed, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute old/new regime tax for a roster file")
+    parser.add_argument('input', help="CSV or .parquet file with UserFinancials columns")
+    parser.add_argument('-o', '--output', required=True, help="CSV or .parquet output file")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument('--assessment-year', default=tax_calculator.DEFAULT_ASSESSMENT_YEAR,
+                        choices=tax_calculator.available_assessment_years())
+    parser.add_argument('--persist', choices=('copy', 'values'), default=None,
+                        help="also upsert rows into UserFinancials (COPY + merge, or execute_values)")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rows, seconds = run(args.input, args.output, args.chunk_size, args.workers, args.assessment_year,
+                        args.persist)
+    logger.info(f"Processed {rows} rows in {seconds:.2f}s ({rows / seconds if seconds else 0:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Local caches for the Tax Advisor Application.
+SQLiteCache is a small persistent key/value cache with TTL and LRU eviction,
+shared by every worker process on the host through one SQLite file.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(*parts):
+    """SHA-256 hex digest over the given string parts (NUL separated)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class SQLiteCache:
+    """
+    Persistent JSON value cache.
+
+    - Entries expire `ttl` seconds after they were written.
+    - At most `max_entries` entries are kept; the least recently read are
+      evicted first.
+    - hits/misses/evictions are counted per process.
+    - `encoder` is an optional json.JSONEncoder subclass for the values.
+    """
+
+    def __init__(self, path, table='cache', ttl=7 * 24 * 3600, max_entries=10000, encoder=None):
+        if not table.isidentifier():
+            raise ValueError(f"invalid cache table name: {table!r}")
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.encoder = encoder
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._conn().execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn().execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_last_access ON {self.table} (last_access)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss or expiry."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._count('misses')
+                return None
+            conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error(f"Cache read failed ({self.table}): {e}")
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(row[0])
+
+    def _evict(self, conn):
+        excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+            self._count('evictions', excess)
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under `key`, evicting LRU entries if full."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) "
+                f"VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, cls=self.encoder), now + self.ttl, now),
+            )
+            self._count('writes')
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Cache write failed ({self.table}): {e}")
+
+    def merge(self, key, fields):
+        """
+        Update the dict stored under `key` with `fields` (starting from {} if
+        missing or expired) in one write transaction, so concurrent merges from
+        other processes are not lost. Returns the merged dict as stored, or
+        None if the write failed.
+        """
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                value = json.loads(row[0]) if row is not None and row[1] >= now else {}
+                value.update(fields)
+                encoded = json.dumps(value, cls=self.encoder)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) "
+                    f"VALUES (?, ?, ?, ?)",
+                    (key, encoded, now + self.ttl, now),
+                )
+                self._evict(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Cache merge failed ({self.table}): {e}")
+            return None
+        self._count('writes')
+        return json.loads(encoded)
+
+    def delete(self, key):
+        try:
+            self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"Cache delete failed ({self.table}): {e}")
+
+    def purge_expired(self):
+        """Delete every expired entry."""
+        try:
+            self._conn().execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.error(f"Cache purge failed ({self.table}): {e}")
+
+    def stats(self):
+        """Snapshot of the hit/miss counters."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,184 @@
+"""
+Buffered, rotating JSON-lines log of advisor conversations.
+Request handlers only enqueue entries; a background thread writes them in
+batches with one fsync per batch. Writes and rotation happen under an
+exclusive file lock, so several worker processes can share one log. Rotated
+files can be gzip-compressed, and iter_entries() replays the whole log
+(rotated files first) one entry at a time for analytics.
+"""
+
+import os
+import json
+import glob
+import gzip
+import time
+import queue
+import fcntl
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationLog:
+    """
+    Non-blocking JSON-lines log writer.
+
+    - write() never blocks; when the queue (`queue_size`) is full the entry is
+      dropped and counted.
+    - The writer thread flushes every `batch_size` entries or `flush_interval`
+      seconds, whichever comes first.
+    - The file is rotated when it exceeds `max_bytes`, or (rotate_daily) when
+      it was last written on an earlier UTC day.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_daily=True, compress=True,
+                 batch_size=100, flush_interval=1.0, queue_size=10000, encoder=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.encoder = encoder
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats = {'written': 0, 'dropped': 0, 'batches': 0, 'rotations': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='conversation-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def write(self, entry):
+        """Enqueue one entry (a JSON-serializable dict)."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning("Conversation log queue full, dropping entry")
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(batch)
+            elif self._closed.is_set():
+                return
+
+    def _flush(self, batch):
+        lines = ''.join(json.dumps(entry, cls=self.encoder) + '\n' for entry in batch)
+        try:
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._maybe_rotate()
+                    with open(self.path, 'a') as f:
+                        f.write(lines)
+                        f.flush()
+                        os.fsync(f.fileno())
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            self._count('errors')
+            logger.error(f"Failed to write to conversation log: {e}")
+            return
+        self._count('written', len(batch))
+        self._count('batches')
+
+    def _maybe_rotate(self):
+        """Rotate the current file if it is too big or from an earlier day (lock held)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        now = datetime.now(timezone.utc)
+        too_big = self.max_bytes and st.st_size >= self.max_bytes
+        stale = self.rotate_daily and datetime.fromtimestamp(st.st_mtime, timezone.utc).date() < now.date()
+        if not (too_big or stale):
+            return
+        rotated = f"{self.path}.{now.strftime('%Y%m%dT%H%M%S%fZ')}"
+        os.rename(self.path, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self._count('rotations')
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the writer thread."""
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+def log_files(path):
+    """Rotated files oldest first, then the live file."""
+    rotated = sorted(f for f in glob.glob(glob.escape(path) + '.*') if not f.endswith('.lock'))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def iter_entries(path, include_rotated=True):
+    """Yield every logged entry in write order without loading whole files."""
+    files = log_files(path) if include_rotated else [path]
+    for name in files:
+        opener = gzip.open if name.endswith('.gz') else open
+        try:
+            with opener(name, 'rt') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping malformed line in {name}")
+        except FileNotFoundError:
+            continue    # rotated away while we were reading
+
+
+def follow(path, poll_interval=1.0, stop=None):
+    """
+    Tail the live log: yield new entries as they are written, reopening the
+    file after rotation. Runs until `stop` (a threading.Event) is set.
+    """
+    position, inode = 0, None
+    while stop is None or not stop.is_set():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            time.sleep(poll_interval)
+            continue
+        if st.st_ino != inode or st.st_size < position:
+            position, inode = 0, st.st_ino
+        if st.st_size > position:
+            with open(path, 'rb') as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break    # partial line; read it on the next pass
+                    position += len(line)
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            time.sleep(poll_interval)
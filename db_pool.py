@@ -0,0 +1,223 @@
+"""
+Process-wide PostgreSQL connection pool for the Tax Advisor Application.
+Replaces the per-request psycopg2.connect() with a size-bounded pool that
+validates idle connections, times out checkouts and keeps simple metrics.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe, size-bounded psycopg2 connection pool.
+
+    - At most `maxconn` connections exist at once; callers wait up to
+      `checkout_timeout` seconds for one to be returned.
+    - Connections idle for longer than `validate_after` seconds are pinged
+      with SELECT 1 before being handed out; dead ones are replaced.
+    - Connections older than `max_lifetime` seconds are recycled.
+    """
+
+    def __init__(self, dsn, minconn=0, maxconn=10, checkout_timeout=5.0,
+                 validate_after=30.0, max_lifetime=1800.0, connect_kwargs=None):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.max_lifetime = max_lifetime
+        self.connect_kwargs = connect_kwargs or {}
+
+        self._cond = threading.Condition()
+        self._idle = deque()    # (conn, created_at, last_used_at)
+        self._created_at = {}   # id(conn) -> creation time, for checked-out conns
+        self._size = 0          # idle + checked out
+        self._closed = False
+        self._metrics = {
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'validation_failures': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+            self._metrics['connections_created'] += 1
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, **self.connect_kwargs)
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """Check a connection out of the pool, waiting up to `timeout` seconds."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    conn, created, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, created, last_used = None, None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['checkout_timeouts'] += 1
+                    raise PoolTimeout(f"no database connection available within {timeout:.1f}s")
+                self._cond.wait(remaining)
+
+        # Connect / validate outside the lock so slow handshakes don't block other callers.
+        now = time.monotonic()
+        discarded = failed = connected = 0
+        try:
+            if conn is not None:
+                expired = now - created > self.max_lifetime
+                stale = now - last_used > self.validate_after
+                if expired or conn.closed or (stale and not self._is_healthy(conn)):
+                    failed = 0 if expired else 1
+                    discarded = 1
+                    self._close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+                connected = 1
+                created = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._metrics['connections_discarded'] += discarded
+                self._metrics['validation_failures'] += failed
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._created_at[id(conn)] = created
+            self._metrics['checkouts'] += 1
+            self._metrics['connections_created'] += connected
+            self._metrics['connections_discarded'] += discarded
+            self._metrics['validation_failures'] += failed
+            self._metrics['wait_seconds_total'] += waited
+            self._metrics['wait_seconds_max'] = max(self._metrics['wait_seconds_max'], waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool; broken or discarded connections are closed."""
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            created = self._created_at.pop(id(conn), time.monotonic())
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._metrics['connections_discarded'] += 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, created, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: check out a connection and always return it."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except Exception:
+            self.putconn(conn, discard=conn.closed)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self):
+        """Snapshot of pool metrics."""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['maxconn'] = self.maxconn
+        return stats
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it from DB_URL on first use.
+    A forked worker gets its own pool; sockets are never shared across processes.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                os.getenv('DB_URL'),
+                minconn=int(os.getenv('DB_POOL_MIN', '0')),
+                maxconn=int(os.getenv('DB_POOL_MAX', '10')),
+                checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+                validate_after=float(os.getenv('DB_POOL_VALIDATE_AFTER', '30')),
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+                connect_kwargs={'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))},
+            )
+            _pool_pid = pid
+    return _pool
@@ -0,0 +1,383 @@
+"""
+Document extraction stages for the Tax Advisor Application.
+Turns an uploaded salary slip / Form 16 PDF into UserFinancials fields:
+PyPDF2 text layer, Tesseract OCR for scanned pages, then Gemini for the
+structured fields. Every stage is a plain function so it can run inside the
+request, a worker thread or a worker process. A document is either a path on
+disk or, for small uploads that never left memory, its bytes.
+PyPDF2, pytesseract and pdf2image are imported on first use, not at import.
+"""
+
+import os
+import io
+import re
+import ast
+import json
+import shutil
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+import field_extractor
+import gemini_client
+import instrumentation
+from cache import SQLiteCache, content_key
+
+logger = logging.getLogger(__name__)
+
+# Extracted document text keyed by the SHA-256 of the uploaded file, so an
+# identical re-upload skips PyPDF2 and OCR entirely.
+text_cache = None
+if os.getenv('TEXT_CACHE_ENABLED', '1') == '1':
+    text_cache = SQLiteCache(
+        os.getenv('TEXT_CACHE_PATH', 'text_cache.sqlite3'),
+        table='document_text',
+        ttl=int(os.getenv('TEXT_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+        max_entries=int(os.getenv('TEXT_CACHE_MAX_ENTRIES', '2000')),
+    )
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Uploads up to this size stay in memory; larger ones roll over to a temp file.
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv('UPLOAD_SPOOL_MAX_MEMORY', str(2 * 1024 * 1024)))
+
+# Salary slips and Form 16s are a few pages; anything longer is rejected up front.
+MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', '20'))
+
+# PDFs parsed at once in this process (upload inspection and text-layer extraction).
+PARSE_CONCURRENCY = int(os.getenv('PARSE_CONCURRENCY', '4'))
+
+# Address-space cap for each OCR worker process, in MB (0 = no cap).
+OCR_MEMORY_LIMIT_MB = int(os.getenv('OCR_MEMORY_LIMIT_MB', '1536'))
+
+_parse_slots = threading.BoundedSemaphore(PARSE_CONCURRENCY)
+
+class DocumentRejected(ValueError):
+    """The upload is not a PDF we will process (unreadable, encrypted or too long)."""
+
+def spool_upload(stream, chunk_size=UPLOAD_CHUNK_SIZE, max_memory=UPLOAD_SPOOL_MAX_MEMORY):
+    """
+    Copy an upload into a SpooledTemporaryFile, hashing it on the way.
+    Returns (spool rewound to the start, SHA-256 hex digest, size in bytes).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        spool.write(chunk)
+        size += len(chunk)
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+def write_spool(spool, path):
+    """Copy a spooled upload to `path`, so OCR processes can read it by name."""
+    spool.seek(0)
+    with open(path, 'wb') as out:
+        shutil.copyfileobj(spool, out, UPLOAD_CHUNK_SIZE)
+
+def _open_document(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+
+def _has_text_layer(page):
+    """True if the page references a font, i.e. it has text to extract rather than only images."""
+    resources = page.get('/Resources')
+    if resources is None:
+        return False
+    return bool(resources.get_object().get('/Font'))
+
+def inspect_pdf(fileobj, max_pages=MAX_PDF_PAGES):
+    """
+    Cheap pre-parse of an upload: the page count and, per page, whether it has
+    a text layer, read from the page tree without extracting any text.
+    Raises DocumentRejected for unreadable, encrypted or over-long PDFs.
+    """
+    import PyPDF2
+    with _parse_slots, instrumentation.span('pdf_inspect'):
+        try:
+            reader = PyPDF2.PdfReader(fileobj)
+            if reader.is_encrypted:
+                raise DocumentRejected("Password-protected PDFs are not supported.")
+            page_count = len(reader.pages)
+            if page_count > max_pages:
+                raise DocumentRejected(f"PDF has {page_count} pages; at most {max_pages} are supported.")
+            text_layer = [_has_text_layer(page) for page in reader.pages]
+        except DocumentRejected:
+            raise
+        except Exception as e:
+            raise DocumentRejected(f"Could not read the PDF: {e}")
+        finally:
+            fileobj.seek(0)
+    return {'pages': page_count, 'text_layer': text_layer}
+
+def limit_memory(limit_mb=OCR_MEMORY_LIMIT_MB):
+    """
+    Process-pool initializer: cap the worker's address space, so one huge
+    page raises MemoryError instead of exhausting the host. Poppler and
+    Tesseract, started as child processes, inherit the cap.
+    """
+    if not limit_mb:
+        return
+    try:
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = limit_mb * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not cap OCR worker memory: {e}")
+
+
+def load_backends():
+    """Import the PDF and OCR libraries now rather than on the first document."""
+    import PyPDF2  # noqa: F401
+    import pytesseract  # noqa: F401
+    import pdf2image  # noqa: F401
+
+# Pages whose PyPDF2 text layer is shorter than this are OCR'd instead.
+MIN_PAGE_TEXT_LENGTH = int(os.getenv('MIN_PAGE_TEXT_LENGTH', '50'))
+
+# Rasterization settings for OCR; grayscale is smaller and OCRs as well as colour.
+OCR_DPI = int(os.getenv('OCR_DPI', '200'))
+OCR_GRAYSCALE = os.getenv('OCR_GRAYSCALE', '1') == '1'
+
+# Stop reading further pages once the salary fields have been found.
+OCR_EARLY_EXIT = os.getenv('OCR_EARLY_EXIT', '1') == '1'
+
+# All of these must match before the remaining pages are skipped.
+_SALARY_FIELD_PATTERNS = (
+    re.compile(r'gross\s+(salary|earnings|pay)|total\s+earnings', re.IGNORECASE),
+    re.compile(r'\bbasic\b', re.IGNORECASE),
+    re.compile(r'\b(tds|income\s+tax|tax\s+deducted)\b', re.IGNORECASE),
+)
+
+def extract_pdf_pages(source):
+    """Extract the embedded text layer of each PDF page with PyPDF2."""
+    import PyPDF2
+    with _parse_slots, instrumentation.span('pdf_parse'), _open_document(source) as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        return [page.extract_text() or '' for page in reader.pages]
+
+def ocr_page(source, page_number, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE):
+    """Rasterize a single (1-based) PDF page and OCR it with Tesseract."""
+    import pytesseract
+    from pdf2image import convert_from_path, convert_from_bytes
+    convert = convert_from_bytes if isinstance(source, bytes) else convert_from_path
+    images = convert(source, dpi=dpi, grayscale=grayscale,
+                     first_page=page_number, last_page=page_number)
+    try:
+        return ''.join(pytesseract.image_to_string(img) for img in images)
+    finally:
+        for img in images:
+            img.close()
+
+def _ocr_page_timed(source, page_number):
+    """ocr_page for a worker process: returns (text, seconds) so the parent can record the timing."""
+    start = time.perf_counter()
+    text = ocr_page(source, page_number)
+    return text, time.perf_counter() - start
+
+def has_salary_fields(text):
+    """True once the text mentions gross salary, basic pay and tax deducted."""
+    return all(pattern.search(text) for pattern in _SALARY_FIELD_PATTERNS)
+
+def extract_document_text(source, page_texts, executor=None, max_in_flight=None,
+                          early_exit=OCR_EARLY_EXIT):
+    """
+    Assemble document text page by page, choosing per page between the PyPDF2
+    text layer and OCR. OCR pages run on `executor` (a process pool) with at
+    most `max_in_flight` pages rasterized at once; without an executor they run
+    serially in-process. Pages are consumed in order and the rest are skipped
+    as soon as the salary fields have been found.
+    Returns (pages, stats): the text used for each page read, in order.
+    """
+    stats = {'pages': len(page_texts), 'text_pages': 0, 'ocr_pages': 0, 'skipped_pages': 0}
+    if max_in_flight is None:
+        max_in_flight = getattr(executor, '_max_workers', 1) or 1
+
+    pending = {}    # page index -> future, for OCR pages submitted ahead
+    next_submit = 0
+    parts = []
+
+    def submit_ahead():
+        nonlocal next_submit
+        while executor is not None and next_submit < len(page_texts) and len(pending) < max_in_flight:
+            if len(page_texts[next_submit].strip()) < MIN_PAGE_TEXT_LENGTH:
+                pending[next_submit] = executor.submit(_ocr_page_timed, source, next_submit + 1)
+            next_submit += 1
+
+    for index, page_text in enumerate(page_texts):
+        if executor is not None:
+            next_submit = max(next_submit, index)
+            submit_ahead()
+        if len(page_text.strip()) >= MIN_PAGE_TEXT_LENGTH:
+            parts.append(page_text)
+            stats['text_pages'] += 1
+        else:
+            future = pending.pop(index, None)
+            if future is not None:
+                text, seconds = future.result()
+                instrumentation.observe('ocr_page', seconds)
+            else:
+                with instrumentation.span('ocr_page'):
+                    text = ocr_page(source, index + 1)
+            parts.append(text)
+            stats['ocr_pages'] += 1
+        if early_exit and index + 1 < len(page_texts) and has_salary_fields(''.join(parts)):
+            stats['skipped_pages'] = len(page_texts) - index - 1
+            break
+
+    for future in pending.values():
+        future.cancel()
+    return parts, stats
+
+# Stage: Gemini LLM extraction
+
+# Bump whenever the extraction prompt below changes, so cached answers for the
+# old prompt are no longer used.
+PROMPT_VERSION = '1'
+
+llm_cache = None
+if os.getenv('LLM_CACHE_ENABLED', '1') == '1':
+    llm_cache = SQLiteCache(
+        os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3'),
+        table='llm_extraction',
+        ttl=int(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+    )
+
+def _gemini_extract(text):
+    """
+    Use Gemini LLM to extract structured salary/tax data from text.
+    Returns a dict with UserFinancials fields, or None if the call failed.
+    Enhanced with error handling and logging.
+    Logs extracted text and Gemini response for debugging.
+    """
+    logger = logging.getLogger("gemini_extraction")
+    # Log the extracted text
+    logger.info(f"Extracted text length: {len(text)}")
+    logger.debug(f"Extracted text (first 500 chars): {text[:500]}")
+    if not text or len(text.strip()) < 30:
+        logger.warning("Extracted text is empty or too short. PDF extraction may have failed.")
+
+    prompt = (
+        """
+        You are an expert financial data extractor. Analyze the following text from a salary slip or Form 16.
+        First, determine if the document represents a single month's salary.
+        If it is a monthly payslip, you MUST multiply the values for the fields gross_salary, basic_salary, hra_received, professional_tax, and tds by 12 to get the annual amount.
+        Fields like deduction_80c, deduction_80d, and rent_paid should be assumed to be annual figures and should NOT be multiplied.
+        
+        Return ONLY a valid JSON object with the following keys, containing the correct annual numeric values (use 0 if a value is not found):
+        - gross_salary
+        - basic_salary
+        - hra_received
+        - rent_paid
+        - deduction_80c
+        - deduction_80d
+        - standard_deduction
+        - professional_tax
+        - tds
+        
+        Do not include any explanation, only the final JSON object.
+        Example for a monthly slip with 50,000 gross salary: {"gross_salary": 600000, ...}
+        
+        Text:
+        """ + text.strip()[:6000] + "\n"
+    )
+    try:
+        logger.info("Sending request to Gemini API...")
+        result = gemini_client.generate_content(prompt)
+        logger.debug(f"Gemini API response (raw): {result}")
+        # Parse Gemini's response for JSON
+        candidates = result.get('candidates', [])
+        if not candidates:
+            logger.error("No candidates in Gemini response.")
+        else:
+            content = candidates[0].get('content', {})
+            parts = content.get('parts', [])
+            if not parts:
+                logger.error("No parts in Gemini candidate content.")
+            else:
+                response_text = parts[0].get('text', '')
+                logger.debug(f"Gemini response text: {response_text}")
+                match = re.search(r'\{.*\}', response_text, re.DOTALL)
+                if match:
+                    try:
+                        data_dict = json.loads(match.group(0))
+                        logger.info(f"Extracted structured data: {data_dict}")
+                    except Exception as e:
+                        logger.warning(f"json.loads failed: {e}, trying ast.literal_eval...")
+                        try:
+                            data_dict = ast.literal_eval(match.group(0))
+                            logger.info(f"Extracted structured data (ast): {data_dict}")
+                        except Exception as e2:
+                            logger.error(f"Failed to parse Gemini JSON: {e2}")
+                            data_dict = None
+                    if data_dict:
+                        # Fill missing fields with 0
+                        fields = [
+                            'gross_salary', 'basic_salary', 'hra_received', 'rent_paid',
+                            'deduction_80c', 'deduction_80d', 'standard_deduction',
+                            'professional_tax', 'tds'
+                        ]
+                        for f in fields:
+                            if f not in data_dict:
+                                logger.warning(f"Field '{f}' missing in Gemini response. Setting to 0.")
+                                data_dict[f] = 0
+                        return data_dict
+                else:
+                    logger.error("No JSON object found in Gemini response text.")
+    except gemini_client.GeminiError as e:
+        logger.error(f"Request to Gemini API failed: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error in Gemini extraction: {e}")
+    return None
+
+def llm_cache_key(text):
+    """Cache key: the prompt version plus the whitespace-normalized text sent to Gemini."""
+    return content_key(PROMPT_VERSION, ' '.join(text.strip()[:6000].split()))
+
+def extract_structured_data(text):
+    """
+    Extract UserFinancials fields from document text.
+    Known layouts are handled by the rule-based field_extractor; Gemini is only
+    asked when its confidence is low. Gemini answers are cached by content hash,
+    so re-uploads of the same document skip the round-trip; failed calls fall
+    back to defaults and are not cached.
+    """
+    with instrumentation.span('field_extract'):
+        rules = field_extractor.extract_fields(text)
+    if rules.confidence >= field_extractor.MIN_CONFIDENCE:
+        logger.info(f"Rule-based extraction ({rules.layout}, confidence {rules.confidence}) used")
+        return rules.fields
+    logger.info(f"Rule-based extraction confidence {rules.confidence} too low, asking Gemini")
+    key = llm_cache_key(text) if llm_cache else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            logger.info("LLM extraction cache hit")
+            return cached
+    data_dict = _gemini_extract(text)
+    if data_dict:
+        if key:
+            llm_cache.set(key, data_dict)
+        return data_dict
+    # Fallback: return empty/defaults
+    logger.warning("Falling back to default values for extracted data.")
+    return {
+        'gross_salary': 0,
+        'basic_salary': 0,
+        'hra_received': 0,
+        'rent_paid': 0,
+        'deduction_80c': 0,
+        'deduction_80d': 0,
+        'standard_deduction': 50000,
+        'professional_tax': 0,
+        'tds': 0,
+    }
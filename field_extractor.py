@@ -0,0 +1,120 @@
+"""
+Rule-based extractor for UserFinancials fields.
+Handles the common, predictable layouts (Form 16 Part B and monthly payslips)
+with precompiled label patterns, so most uploads never need the Gemini call.
+Every result carries a confidence score; extraction.extract_structured_data
+only falls back to the LLM when it is below MIN_CONFIDENCE.
+"""
+
+import os
+import re
+from collections import namedtuple
+
+MIN_CONFIDENCE = float(os.getenv('FIELD_EXTRACTOR_MIN_CONFIDENCE', '0.8'))
+
+ExtractionResult = namedtuple('ExtractionResult', ['fields', 'confidence', 'layout', 'field_confidence'])
+
+# Fields a monthly payslip reports per month (annualized x12, as in the LLM prompt).
+MONTHLY_FIELDS = ('gross_salary', 'basic_salary', 'hra_received', 'professional_tax', 'tds')
+
+# Without these the document is not worth trusting to rules alone.
+CORE_FIELDS = ('gross_salary', 'basic_salary', 'tds')
+
+_LAYOUT_PATTERNS = (
+    ('form16', re.compile(r'form\s*(no\.?\s*)?16\b', re.IGNORECASE)),
+    ('payslip', re.compile(r'pay\s*slip|salary\s+slip|salary\s+statement|earnings\s+and\s+deductions', re.IGNORECASE)),
+)
+
+# (field, label pattern, confidence of a match); each field takes its first match.
+_FIELD_PATTERNS = (
+    ('gross_salary', re.compile(r'gross\s+(salary|earnings|pay)|total\s+earnings|salary\s+as\s+per\s+provisions', re.IGNORECASE), 0.95),
+    ('basic_salary', re.compile(r'\bbasic(\s+(salary|pay))?\b', re.IGNORECASE), 0.9),
+    ('hra_received', re.compile(r'house\s+rent\s+allowance|\bh\.?r\.?a\b', re.IGNORECASE), 0.9),
+    ('rent_paid', re.compile(r'\brent\s+paid\b', re.IGNORECASE), 0.9),
+    ('deduction_80c', re.compile(r'\b(section\s*)?80\s*c\b(?!c|d)', re.IGNORECASE), 0.9),
+    ('deduction_80d', re.compile(r'\b(section\s*)?80\s*d\b', re.IGNORECASE), 0.9),
+    ('standard_deduction', re.compile(r'standard\s+deduction', re.IGNORECASE), 0.95),
+    ('professional_tax', re.compile(r'professional\s+tax|tax\s+on\s+employment|\bp\.?\s?tax\b', re.IGNORECASE), 0.9),
+    ('tds', re.compile(r'\btds\b|tax\s+deducted(\s+at\s+source)?|income\s+tax', re.IGNORECASE), 0.85),
+)
+
+# An amount: optional currency marker, Indian or western digit grouping, optional paise.
+_AMOUNT = re.compile(r'(?:₹|rs\.?|inr)?\s*(\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)', re.IGNORECASE)
+_YEAR = re.compile(r'(19|20)\d{2}$')
+
+_MONTHLY = re.compile(
+    r'for\s+the\s+month|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*[\s,\'-]*(19|20)?\d{2}\b',
+    re.IGNORECASE,
+)
+
+
+def _first_amount(line, start):
+    """First plausible money amount on `line` after position `start`."""
+    for match in _AMOUNT.finditer(line, start):
+        raw = match.group(1)
+        if _YEAR.match(raw) or (len(raw) <= 2 and ',' not in raw):
+            continue    # years and note/column numbers, not money
+        return float(raw.replace(',', ''))
+    return None
+
+
+def detect_layout(text):
+    """'form16', 'payslip' or None."""
+    for layout, pattern in _LAYOUT_PATTERNS:
+        if pattern.search(text):
+            return layout
+    return None
+
+
+def extract_fields(text):
+    """
+    Extract UserFinancials fields from document text with label patterns.
+    Returns an ExtractionResult; fields not found are 0 (standard_deduction 50000).
+    """
+    layout = detect_layout(text)
+    found = {}
+    field_confidence = {}
+    for line in text.splitlines():
+        # Labels on this line, left to right; a table row may hold several.
+        labels = []
+        for field, pattern, confidence in _FIELD_PATTERNS:
+            if field not in found:
+                match = pattern.search(line)
+                if match:
+                    labels.append((match.start(), match.end(), field, confidence))
+        labels.sort()
+        last_end = -1
+        for i, (start, end, field, confidence) in enumerate(labels):
+            if start < last_end or field in found:
+                continue    # overlaps a label already used on this line
+            next_start = labels[i + 1][0] if i + 1 < len(labels) else len(line)
+            amount = _first_amount(line[:max(next_start, end)], end)
+            if amount is not None:
+                found[field] = amount
+                field_confidence[field] = confidence
+            last_end = end
+
+    fields = {field: 0 for field, _, _ in _FIELD_PATTERNS}
+    fields['standard_deduction'] = 50000
+    fields.update(found)
+    monthly = layout == 'payslip' and bool(_MONTHLY.search(text))
+    if monthly:
+        for field in MONTHLY_FIELDS:
+            fields[field] = fields[field] * 12
+
+    confidence = _score(fields, layout, field_confidence)
+    if layout == 'payslip' and not monthly:
+        confidence *= 0.7    # can't tell whether to annualize; let the LLM decide
+    return ExtractionResult(fields, round(confidence, 4), layout, field_confidence)
+
+
+def _score(fields, layout, field_confidence):
+    """Overall confidence: core-field coverage x layout certainty x sanity checks."""
+    if not layout:
+        return 0.0
+    core = [field_confidence.get(field, 0.0) for field in CORE_FIELDS]
+    score = sum(core) / len(core)
+    gross = fields['gross_salary']
+    if gross <= 0 or fields['basic_salary'] > gross or fields['hra_received'] > gross or fields['tds'] > gross:
+        score *= 0.5
+    return score
@@ -0,0 +1,301 @@
+"""
+Shared Gemini API client.
+One pooled HTTP session for every Gemini call in the process, with bounded
+concurrency, retries with exponential backoff and jitter, and a circuit
+breaker that fails fast while the API is degraded so callers can go straight
+to their fallbacks. `requests` is imported and the session created on the
+first call, so importing this module stays cheap.
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+GEMINI_ENDPOINT = os.getenv(
+    'GEMINI_ENDPOINT',
+    'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash',
+)
+CONNECT_TIMEOUT = float(os.getenv('GEMINI_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.getenv('GEMINI_READ_TIMEOUT', '20'))
+MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '0.5'))
+BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', '4'))
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '5'))
+
+# Status codes worth retrying; everything else is returned to the caller as-is.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """The Gemini call failed; callers should use their fallback."""
+
+
+class CircuitOpenError(GeminiError):
+    """The circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    -> calls go through; `failure_threshold` failures in a row open it.
+    open      -> calls fail fast for `reset_timeout` seconds.
+    half-open -> one trial call; success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def rejecting(self):
+        """True if allow() would refuse now; unlike allow() it never claims the half-open trial."""
+        with self._lock:
+            state = self._state()
+            return state == 'open' or (state == 'half-open' and self._trial_in_flight)
+
+    def allow(self):
+        """True if a call may be attempted now."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning("Gemini circuit breaker opened")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def _new_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The shared HTTP session, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
+
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('GEMINI_BREAKER_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET', '30')),
+)
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Snapshot of client counters plus the breaker state."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot['breaker'] = breaker.state
+    return snapshot
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _post(method, payload, stream=False, timeout=None):
+    """
+    POST to {GEMINI_ENDPOINT}:{method} with retries, concurrency limit and breaker.
+    For stream=True the concurrency slot stays held until the caller releases it.
+    """
+    import requests
+    session = get_session()
+    # Fail fast while the breaker is open, without queueing for a slot
+    if breaker.rejecting():
+        _count('short_circuited')
+        raise CircuitOpenError("Gemini circuit breaker is open")
+    # Only then take the slot, and claim a half-open trial after that: the trial
+    # must never be held by a call that gives up waiting in the queue.
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise GeminiError("Too many concurrent Gemini calls")
+    release_slot = True
+    try:
+        if not breaker.allow():
+            _count('short_circuited')
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        _count('calls')
+        resp = _attempt(session, method, payload, stream, timeout or (CONNECT_TIMEOUT, READ_TIMEOUT))
+        if stream:
+            # The caller reads the body later and releases the slot when done.
+            release_slot = False
+        return resp
+    finally:
+        if release_slot:
+            _slots.release()
+
+
+def _attempt(session, method, payload, stream, timeout):
+    """The retry loop of _post; every exit records an outcome on the breaker."""
+    import requests
+    url = f"{GEMINI_ENDPOINT}:{method}"
+    params = {'key': os.getenv('GEMINI_API_KEY')}
+    if stream:
+        params['alt'] = 'sse'
+    last_error = None
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                _count('retries')
+                time.sleep(_backoff(attempt - 1))
+            try:
+                resp = session.post(url, params=params, data=json.dumps(payload),
+                                    timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+            if resp.status_code in RETRY_STATUSES:
+                last_error = requests.HTTPError(f"{resp.status_code} from Gemini", response=resp)
+                resp.close()
+                continue
+            try:
+                resp.raise_for_status()
+            except requests.HTTPError as e:
+                resp.close()
+                breaker.record_success()    # the API is up; the request itself is bad
+                raise GeminiError(str(e))
+            breaker.record_success()
+            return resp
+    except GeminiError:
+        raise
+    except Exception as e:
+        # Anything unexpected still resolves a half-open trial
+        breaker.record_failure()
+        _count('failures')
+        raise GeminiError(f"Gemini call failed: {e!r}") from e
+    breaker.record_failure()
+    _count('failures')
+    raise GeminiError(f"Gemini call failed after {MAX_RETRIES + 1} attempts: {last_error}")
+
+
+def ping(timeout=None):
+    """
+    Cheap reachability check for health probes: GET the model's metadata.
+    No generation, no retries, and it bypasses the breaker and concurrency slots.
+    """
+    if breaker.state == 'open':
+        raise GeminiError("circuit breaker is open")
+    resp = get_session().get(GEMINI_ENDPOINT, params={'key': os.getenv('GEMINI_API_KEY')},
+                             timeout=timeout or (CONNECT_TIMEOUT, CONNECT_TIMEOUT))
+    with resp:
+        if resp.status_code != 200:
+            raise GeminiError(f"{resp.status_code} from Gemini model endpoint")
+    return f"reachable, breaker {breaker.state}"
+
+
+def generate_content(prompt, timeout=None):
+    """Call generateContent and return the decoded JSON response."""
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    with instrumentation.span('llm_call'):
+        resp = _post('generateContent', payload, timeout=timeout)
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise GeminiError(f"Invalid JSON from Gemini: {e}")
+
+
+def generate_text(prompt, timeout=None):
+    """Call generateContent and return the first candidate's text, or None on failure."""
+    try:
+        result = generate_content(prompt, timeout=timeout)
+        return result['candidates'][0]['content']['parts'][0]['text']
+    except GeminiError as e:
+        logger.error(f"Gemini API call failed: {e}")
+    except (KeyError, IndexError, TypeError) as e:
+        logger.error(f"Unexpected Gemini response shape: {e}")
+    return None
+
+
+def stream_text(prompt, timeout=None):
+    """
+    Call streamGenerateContent (server-sent events) and yield text chunks as
+    Gemini produces them. Raises GeminiError if the stream cannot be opened
+    or breaks off part way (chunks already yielded are then incomplete).
+    """
+    import requests
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    start = time.perf_counter()
+    resp = _post('streamGenerateContent', payload, stream=True, timeout=timeout)
+    instrumentation.observe('llm_stream_open', time.perf_counter() - start)
+    try:
+        for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            try:
+                event = json.loads(line[5:].strip())
+                for part in event['candidates'][0]['content']['parts']:
+                    if part.get('text'):
+                        yield part['text']
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                logger.warning(f"Skipping malformed Gemini stream event: {e}")
+    except requests.RequestException as e:
+        # Includes ChunkedEncodingError when the upstream drops mid-stream
+        breaker.record_failure()
+        _count('failures')
+        raise GeminiError(f"Gemini stream interrupted: {e!r}") from e
+    finally:
+        resp.close()
+        _slots.release()
+        instrumentation.observe('llm_stream', time.perf_counter() - start)
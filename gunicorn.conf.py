@@ -0,0 +1,31 @@
+"""
+gunicorn settings: `gunicorn app:app` picks this file up automatically.
+With PREWARM=1 each worker loads the lazy libraries after fork (see prewarm.py).
+
+Workers are threaded (gthread): an advisor stream holds a thread until
+Gemini finishes, so the app caps concurrent streams per worker at
+ADVISOR_MAX_STREAMS (default WEB_THREADS // 2), leaving the other threads
+for ordinary requests.
+"""
+
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '8'))
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+
+# Per-process stores would send a poll or the next step to a worker that
+# never saw the job or session, so refuse them with more than one worker
+if workers > 1:
+    for setting in ('JOB_BACKEND', 'SESSION_STORE'):
+        if os.getenv(setting) == 'memory':
+            raise RuntimeError(f"{setting}=memory needs WEB_CONCURRENCY=1 (got {workers} workers); use sqlite")
+
+
+def post_fork(server, worker):
+    import prewarm
+    if prewarm.PREWARM:
+        import app
+        prewarm.prewarm(app.extraction_pipeline, monitor=app.health_monitor)
@@ -0,0 +1,112 @@
+"""
+Cached dependency probes for the readiness endpoint.
+A background thread checks each dependency (database, Gemini, Tesseract)
+every HEALTH_PROBE_INTERVAL seconds and keeps the last result in memory, so
+a load-balancer probe only reads a dict and never touches the dependency
+itself. A result older than HEALTH_STALE_AFTER seconds counts as failed:
+a wedged prober must not keep reporting the last good state.
+
+Only the probes named in HEALTH_REQUIRED (default: db) decide readiness;
+the others are reported, and mark the instance 'degraded' when failing.
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '10'))
+STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', '30'))
+REQUIRED = {name.strip() for name in os.getenv('HEALTH_REQUIRED', 'db').split(',') if name.strip()}
+
+
+class HealthMonitor:
+    """Runs registered checks in a background thread and serves their cached results."""
+
+    def __init__(self, interval=PROBE_INTERVAL, stale_after=STALE_AFTER, required=REQUIRED):
+        self.interval = interval
+        self.stale_after = stale_after
+        self.required = set(required)
+        self.started_at = time.time()
+        self._checks = {}       # name -> callable returning a detail string, raising on failure
+        self._results = {}      # name -> {'ok', 'detail', 'checked_at', 'latency_ms'}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, name, check):
+        self._checks[name] = check
+
+    def ensure_started(self):
+        """Start the prober thread in this process (again after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != pid or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='health-probe', daemon=True)
+                self._thread.start()
+                self._pid = pid
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            time.sleep(self.interval)
+
+    def probe_all(self):
+        for name, check in self._checks.items():
+            start = time.perf_counter()
+            try:
+                ok, detail = True, check()
+            except Exception as e:
+                ok, detail = False, str(e).strip() or type(e).__name__
+            result = {
+                'ok': ok,
+                'detail': detail,
+                'checked_at': time.time(),
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+            with self._lock:
+                previous = self._results.get(name)
+                self._results[name] = result
+            if previous is None or previous['ok'] != ok:
+                log = logger.info if ok else logger.warning
+                log(f"Health probe {name}: {'ok' if ok else 'failing'} ({detail})")
+
+    def report(self):
+        """(ready, status, per-check results) from the cached probe results."""
+        self.ensure_started()
+        now = time.time()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        checks = {}
+        for name in self._checks:
+            result = results.get(name)
+            if result is None:
+                result = {'ok': False, 'detail': 'not checked yet'}
+            else:
+                result['age_s'] = round(now - result.pop('checked_at'), 1)
+                if result['age_s'] > self.stale_after:
+                    result['ok'] = False
+                    result['detail'] = f"stale: last checked {result['age_s']:.0f}s ago"
+            result['required'] = name in self.required
+            checks[name] = result
+        ready = all(c['ok'] for c in checks.values() if c['required'])
+        if not ready:
+            status = 'unavailable'
+        elif all(c['ok'] for c in checks.values()):
+            status = 'ok'
+        else:
+            status = 'degraded'
+        return ready, status, checks
+
+    def is_ok(self, name):
+        """Cached result of one check, False when missing or stale."""
+        return self.report()[2].get(name, {}).get('ok', False)
+
+
+def tesseract_check():
+    import pytesseract
+    return f"tesseract {pytesseract.get_tesseract_version()}"
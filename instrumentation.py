@@ -0,0 +1,220 @@
+"""
+Request and stage latency instrumentation.
+span('name') times a block (DB connect/query, PDF parse, OCR page, LLM call,
+template render, ...) into a per-stage histogram; init_app() times every
+request and template render. render_metrics() returns all histograms in the
+Prometheus text format for /metrics. Metrics are per process: scrape every
+worker, or run one.
+
+Opt-in profiler (PROFILE_SLOW_REQUESTS=1): a background thread samples the
+stacks of in-flight request threads every PROFILE_SAMPLE_INTERVAL seconds;
+requests slower than PROFILE_SLOW_THRESHOLD seconds get their samples written
+to PROFILE_DIR as folded stacks ("frame;frame;frame count"), ready for
+flamegraph.pl or speedscope.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'tax_advisor'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROFILE_SLOW_REQUESTS = os.getenv('PROFILE_SLOW_REQUESTS', '0') == '1'
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_SLOW_THRESHOLD = float(os.getenv('PROFILE_SLOW_THRESHOLD', '1.0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Requests slower than this are logged with their span breakdown.
+SLOW_REQUEST_LOG_THRESHOLD = float(os.getenv('SLOW_REQUEST_LOG_THRESHOLD', '2.0'))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels (Prometheus semantics)."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _labels(self, labelvalues, extra=None):
+        pairs = list(zip(self.labelnames, labelvalues))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labelvalues, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._labels(labelvalues, ('le', '+Inf'))} {values[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(labelvalues)} {values[-2]}")
+            lines.append(f"{self.name}_count{self._labels(labelvalues)} {values[-1]}")
+        return '\n'.join(lines)
+
+
+request_duration = Histogram(
+    f'{METRIC_PREFIX}_request_duration_seconds', "HTTP request latency.",
+    ('endpoint', 'method', 'status'),
+)
+stage_duration = Histogram(
+    f'{METRIC_PREFIX}_stage_duration_seconds', "Latency of one processing stage.",
+    ('stage',),
+)
+
+_local = threading.local()
+
+
+def observe(stage, seconds):
+    """Record a stage duration measured elsewhere (e.g. in a worker process)."""
+    stage_duration.observe(seconds, stage)
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def render_metrics():
+    """Every histogram in the Prometheus text exposition format (0.0.4)."""
+    return '\n'.join(h.render() for h in (request_duration, stage_duration)) + '\n'
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads into folded-stack counters."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._threads = {}      # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] = Counter()
+
+    def stop(self, thread_id):
+        """Stop sampling a thread; returns its samples."""
+        with self._lock:
+            return self._threads.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._threads:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def _dump_profile(samples, label, seconds):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}_{label}_{seconds:.2f}s.folded")
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+profiler = SamplingProfiler() if PROFILE_SLOW_REQUESTS else None
+
+
+def init_app(app):
+    """Time every request and template render of a Flask app."""
+    from flask import request, before_render_template, template_rendered
+
+    @app.before_request
+    def _start_request():
+        _local.request_start = time.perf_counter()
+        _local.spans = {}
+        if profiler:
+            profiler.start(threading.get_ident())
+
+    @app.after_request
+    def _finish_request(response):
+        start = getattr(_local, 'request_start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        request_duration.observe(seconds, endpoint, request.method, str(response.status_code))
+        spans, _local.spans, _local.request_start = _local.spans, None, None
+        if seconds >= SLOW_REQUEST_LOG_THRESHOLD:
+            breakdown = ', '.join(f"{k}={v:.3f}s" for k, v in spans.items())
+            logger.warning(f"Slow request {request.method} {request.path} {seconds:.2f}s: {breakdown}")
+        if profiler:
+            samples = profiler.stop(threading.get_ident())
+            if seconds >= PROFILE_SLOW_THRESHOLD and samples:
+                path = _dump_profile(samples, endpoint, seconds)
+                logger.info(f"Profile of slow request {request.path} written to {path}")
+        return response
+
+    @app.teardown_request
+    def _teardown_request(error):
+        # after_request is skipped when a view raises; don't leave the thread registered
+        _local.spans = _local.request_start = None
+        if profiler:
+            profiler.stop(threading.get_ident())
+
+    def _render_started(sender, template, context, **extra):
+        _local.render_start = time.perf_counter()
+
+    def _render_finished(sender, template, context, **extra):
+        start = getattr(_local, 'render_start', None)
+        if start is not None:
+            observe('render', time.perf_counter() - start)
+            _local.render_start = None
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
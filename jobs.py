@@ -0,0 +1,298 @@
+"""
+Background job pipeline for document extraction.
+/upload enqueues a job and returns immediately; a bounded worker pool runs
+the extraction stages (text layer -> OCR -> fields) and records the status,
+result and per-stage timings in a job store that the status endpoint polls.
+
+Job stores:
+- 'memory': a dict guarded by a lock (single worker process only: a status
+  poll served by another worker would not find the job).
+- 'sqlite' (the default): a SQLite file shared by every worker process on the host.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import extraction
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when the pipeline has no free slot for a new job (backpressure)."""
+
+
+class MemoryJobStore:
+    """Job records kept in process memory."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, session_id):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'session_id': session_id,
+                'status': STATUS_QUEUED,
+                'stage': None,
+                'result': None,
+                'error': None,
+                'timings': {},
+                'created_at': now,
+                'updated_at': now,
+            }
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['updated_at'] = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, timings=dict(job['timings'])) if job else None
+
+    def purge(self, older_than):
+        cutoff = time.time() - older_than
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job['updated_at'] < cutoff]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Job records in a SQLite file, visible to every worker process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extraction_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    timings TEXT NOT NULL DEFAULT '{}',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id, session_id):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO extraction_jobs (job_id, session_id, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, session_id, STATUS_QUEUED, now, now),
+        )
+
+    def update(self, job_id, **fields):
+        for key in ('result', 'timings'):
+            if key in fields:
+                fields[key] = json.dumps(fields[key])
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        self._conn().execute(
+            f"UPDATE extraction_jobs SET {assignments} WHERE job_id = ?",
+            (*fields.values(), job_id),
+        )
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT * FROM extraction_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['timings'] = json.loads(job['timings'])
+        return job
+
+    def purge(self, older_than):
+        self._conn().execute(
+            "DELETE FROM extraction_jobs WHERE updated_at < ?", (time.time() - older_than,)
+        )
+
+
+class ExtractionPipeline:
+    """
+    Bounded extraction worker pool.
+
+    `max_workers` threads orchestrate jobs (the LLM stage is network-bound);
+    OCR is CPU-bound and runs page by page in a separate process pool of
+    `ocr_processes`, shared by all jobs, each capped at `ocr_memory_limit_mb`.
+    At most `max_pending` jobs may be queued or running; submit() raises
+    QueueFull beyond that so the web tier can shed load.
+    `on_done(job_id, session_id, extracted)`, if given, is called when a job succeeds.
+    """
+
+    def __init__(self, store, max_workers=4, max_pending=16, ocr_processes=2, job_ttl=3600,
+                 ocr_memory_limit_mb=extraction.OCR_MEMORY_LIMIT_MB, on_done=None):
+        self.store = store
+        self.on_done = on_done
+        self.job_ttl = job_ttl
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='extract')
+        self._ocr_processes = ocr_processes
+        self._ocr_memory_limit_mb = ocr_memory_limit_mb
+        self._ocr_executor = None
+        self._ocr_lock = threading.Lock()
+
+    def _ocr_pool(self):
+        with self._ocr_lock:
+            if self._ocr_executor is None:
+                # Workers come from a clean fork server, not from this multi-threaded
+                # process: a lock held by another thread at fork time would deadlock them
+                self._ocr_executor = ProcessPoolExecutor(
+                    max_workers=self._ocr_processes,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=extraction.limit_memory,
+                    initargs=(self._ocr_memory_limit_mb,),
+                )
+            return self._ocr_executor
+
+    def _reset_ocr_pool(self, broken):
+        """Drop a pool whose worker died (e.g. killed at its memory cap); the next job starts a new one."""
+        with self._ocr_lock:
+            if self._ocr_executor is broken:
+                self._ocr_executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def prewarm(self):
+        """Start the OCR worker processes and load their PDF/OCR libraries ahead of the first job."""
+        pool = self._ocr_pool()
+        for future in [pool.submit(extraction.load_backends) for _ in range(self._ocr_processes)]:
+            future.result()
+
+    def submit(self, source, session_id, file_hash=None, text_layer=None):
+        """
+        Enqueue extraction of a PDF (a path, which the job deletes when done,
+        or the bytes of a small upload); returns the job id.
+        `file_hash` (SHA-256 of the file) lets identical uploads reuse cached text.
+        `text_layer` (per-page flags from extraction.inspect_pdf) lets a scanned
+        document skip the PyPDF2 pass and go straight to OCR.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("extraction queue is full, try again shortly")
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id, session_id)
+            self._executor.submit(self._run, job_id, source, session_id, file_hash, text_layer)
+        except Exception:
+            self._slots.release()
+            raise
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _stage(self, job_id, timings, name, func, *args):
+        self.store.update(job_id, stage=name)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = round(time.perf_counter() - start, 4)
+            self.store.update(job_id, timings=timings)
+
+    def _run(self, job_id, source, session_id, file_hash, text_layer):
+        timings = {}
+        ocr_pool = None
+        try:
+            self.store.update(job_id, status=STATUS_RUNNING)
+            cached = extraction.text_cache.get(file_hash) if file_hash and extraction.text_cache else None
+            if cached is not None:
+                pages = cached['pages']
+                timings['text_cache_hit'] = True
+            else:
+                if text_layer and not any(text_layer):
+                    pages = [''] * len(text_layer)    # scanned: nothing for PyPDF2 to find
+                else:
+                    pages = self._stage(job_id, timings, 'parse', extraction.extract_pdf_pages, source)
+                if any(len(t.strip()) < extraction.MIN_PAGE_TEXT_LENGTH for t in pages):
+                    ocr_pool = self._ocr_pool()
+                    pages, stats = self._stage(job_id, timings, 'ocr', extraction.extract_document_text,
+                                               source, pages, ocr_pool)
+                    logger.info(f"Extraction job {job_id} page sources: {stats}")
+                if file_hash and extraction.text_cache:
+                    extraction.text_cache.set(file_hash, {'pages': pages})
+            text = ''.join(pages)
+            extracted = self._stage(job_id, timings, 'fields', extraction.extract_structured_data, text)
+            extracted['session_id'] = session_id
+            self.store.update(job_id, status=STATUS_DONE, stage=None, result=extracted)
+            if self.on_done:
+                try:
+                    self.on_done(job_id, session_id, extracted)
+                except Exception as e:
+                    logger.error(f"Extraction job {job_id} on_done callback failed: {e}")
+            logger.info(f"Extraction job {job_id} done, stage timings: {timings}")
+        except (MemoryError, BrokenProcessPool) as e:
+            logger.error(f"Extraction job {job_id} ran out of memory: {e!r}")
+            if isinstance(e, BrokenProcessPool) and ocr_pool is not None:
+                self._reset_ocr_pool(ocr_pool)
+            self.store.update(job_id, status=STATUS_FAILED,
+                              error="The document is too large to process. Try a smaller or lower-resolution PDF.")
+        except Exception as e:
+            logger.error(f"Extraction job {job_id} failed: {e}")
+            self.store.update(job_id, status=STATUS_FAILED, error=str(e))
+        finally:
+            if isinstance(source, str):
+                try:
+                    os.remove(source)
+                except OSError:
+                    pass
+            self._slots.release()
+            self.store.purge(self.job_ttl)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if self._ocr_executor is not None:
+            self._ocr_executor.shutdown(wait=wait)
+
+
+def create_pipeline_from_env(on_done=None):
+    """Build the pipeline configured by the JOB_* environment variables."""
+    backend = os.getenv('JOB_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        store = SQLiteJobStore(os.getenv('JOB_DB_PATH', 'extraction_jobs.sqlite3'))
+    elif backend == 'memory':
+        store = MemoryJobStore()
+    else:
+        raise ValueError(f"Unknown JOB_BACKEND: {backend}")
+    return ExtractionPipeline(
+        store,
+        max_workers=int(os.getenv('JOB_WORKERS', '4')),
+        max_pending=int(os.getenv('JOB_MAX_PENDING', '16')),
+        ocr_processes=int(os.getenv('JOB_OCR_PROCESSES', '2')),
+        job_ttl=int(os.getenv('JOB_TTL_SECONDS', '3600')),
+        on_done=on_done,
+    )
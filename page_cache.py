@@ -0,0 +1,154 @@
+"""
+Rendered-page caches for the Tax Advisor Application.
+
+StaticPages renders a template that does not depend on the request once,
+keeps identity, gzip and (when the optional `brotli` package is installed)
+brotli bodies, and answers with ETag/Last-Modified so browsers and proxies
+revalidate with a 304. The ETag is a hash of the rendered body, so every
+worker computes the same one.
+
+FragmentCache backs the `cached(...)` template global: wrap an expensive,
+input-determined block of a dynamic template in
+    {% call cached('name', key...) %} ... {% endcall %}
+and it is rendered once per distinct key. Key it only on inputs shared by
+many users: a block keyed on one user's figures is a single-use entry.
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_PAGE_MAX_AGE = int(os.getenv('STATIC_PAGE_MAX_AGE', '300'))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', '2048'))
+
+
+class RenderedPage:
+    """One pre-rendered page in every encoding we serve."""
+
+    def __init__(self, html, last_modified, source_mtime=None):
+        self.bodies = {'identity': html.encode('utf-8')}
+        self.bodies['gzip'] = gzip.compress(self.bodies['identity'], compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(self.bodies['identity'], quality=11)
+        self.etag = hashlib.sha256(self.bodies['identity']).hexdigest()[:32]
+        self.last_modified = last_modified
+        self.source_mtime = source_mtime
+
+    def encoding_for(self, accept_encodings):
+        """Smallest encoding the client accepts (werkzeug Accept-Encoding header)."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+
+class StaticPages:
+    """Pre-rendered, precompressed pages served with conditional GET."""
+
+    def __init__(self, app, max_age=STATIC_PAGE_MAX_AGE):
+        self.app = app
+        self.max_age = max_age
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def _template_mtime(self, template_name):
+        path = os.path.join(self.app.root_path, self.app.template_folder, template_name)
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def get(self, template_name, **context):
+        """The page for `template_name`, rendered on first use (again if the template changed in debug)."""
+        from flask import render_template
+        page = self._pages.get(template_name)
+        if page is not None and self.app.jinja_env.auto_reload:
+            if page.source_mtime != self._template_mtime(template_name):
+                page = None
+        if page is None:
+            mtime = self._template_mtime(template_name)
+            page = RenderedPage(render_template(template_name, **context),
+                                last_modified=mtime or time.time(), source_mtime=mtime)
+            with self._lock:
+                self._pages[template_name] = page
+            logger.info(f"Pre-rendered {template_name}: " + ', '.join(
+                f"{encoding} {len(body):,}B" for encoding, body in page.bodies.items()))
+        return page
+
+    def response(self, template_name, status=200, revalidate=False, **context):
+        """
+        Serve a pre-rendered page; 304 when the client's copy is current.
+        With `revalidate` the page is sent with no-cache instead of max-age, so
+        the client asks every time: for pages that flashed messages replace.
+        """
+        from flask import request
+        page = self.get(template_name, **context)
+        encoding = page.encoding_for(request.accept_encodings)
+        response = self.app.response_class(page.bodies[encoding], status=status, mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        if status == 200:
+            # One entity tag per representation, as the bodies differ byte for byte
+            response.set_etag(f"{page.etag}-{encoding}")
+            response.last_modified = page.last_modified
+            if revalidate:
+                response.cache_control.no_cache = True
+            else:
+                response.cache_control.public = True
+                response.cache_control.max_age = self.max_age
+            response.make_conditional(request)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {name: {encoding: len(body) for encoding, body in page.bodies.items()}
+                    for name, page in self._pages.items()}
+
+
+class FragmentCache:
+    """LRU of rendered template fragments keyed by name and the inputs they depend on."""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __call__(self, *key, caller):
+        """Template global: {% call cached('name', key...) %}...{% endcall %}"""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self._counters['hits'] += 1
+                return fragment
+            self._counters['misses'] += 1
+        fragment = Markup(caller())
+        with self._lock:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+                self._counters['evictions'] += 1
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._fragments))
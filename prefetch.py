@@ -0,0 +1,132 @@
+"""
+Speculative generation of the advisor's opening question.
+As soon as /calculate has saved a user's financials, the question for
+/advisor/<session_id> is generated in the background. `on_done` hands each
+finished question to the shared session state, so the advisor page is
+usually served without a Gemini round-trip whichever worker it lands on;
+the worker that generated it can also wait briefly on a question still in
+flight. At most `max_pending` generations are queued or running: beyond
+that /calculate skips the prefetch. Unused entries expire after `ttl`
+seconds, and a question still queued when its entry expires or is evicted
+is cancelled.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class AdvisorPrefetcher:
+    """
+    In-memory, TTL-bounded map of session_id -> question future. Only the
+    future is kept: `generate` is called in a background thread with the user
+    row and must return the question text (or None). `on_done(session_id,
+    question)`, if given, is called with every question generated.
+    """
+
+    def __init__(self, generate, ttl=600, max_entries=1000, max_workers=2, max_pending=8, on_done=None):
+        self.generate = generate
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self.on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._entries = OrderedDict()   # session_id -> [expires_at, future, used]
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'skipped': 0, 'hits': 0, 'misses': 0, 'timeouts': 0,
+                       'cancelled': 0, 'expired_unused': 0, 'evicted': 0}
+
+    def _cancel(self, futures):
+        """Cancel generations nobody will read if they have not started (call without the lock)."""
+        cancelled = sum(1 for future in futures if future.cancel())
+        if cancelled:
+            with self._lock:
+                self._stats['cancelled'] += cancelled
+
+    def _expire(self, now):
+        """Drop expired and excess entries (lock held); returns their futures for _cancel."""
+        dropped = []
+        for session_id in [s for s, entry in self._entries.items() if entry[0] <= now]:
+            entry = self._entries.pop(session_id)
+            dropped.append(entry[1])
+            if not entry[2]:
+                self._stats['expired_unused'] += 1
+        while len(self._entries) > self.max_entries:
+            dropped.append(self._entries.popitem(last=False)[1][1])
+            self._stats['evicted'] += 1
+        return dropped
+
+    def _finished(self, session_id, future):
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled() or self.on_done is None:
+            return
+        try:
+            question = future.result()
+            if question:
+                self.on_done(session_id, question)
+        except Exception as e:
+            logger.warning(f"Prefetched advisor question unavailable for {session_id}: {e}")
+
+    def schedule(self, session_id, user_data):
+        """
+        Start generating the opening question for a freshly saved session.
+        Returns False, without queueing anything, when `max_pending` are already queued or running.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['skipped'] += 1
+                return False
+            self._pending += 1
+        future = self._executor.submit(self.generate, user_data)
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            self._entries[session_id] = [now + self.ttl, future, False]
+            self._stats['scheduled'] += 1
+            dropped = self._expire(now)
+        future.add_done_callback(lambda f: self._finished(session_id, f))
+        self._cancel(dropped + ([previous[1]] if previous else []))
+        return True
+
+    def take_question(self, session_id, wait=None):
+        """
+        The prefetched question, or None on a miss, when generation failed, or
+        when it is not ready within `wait` seconds. A question still queued at
+        that point is cancelled (the caller generates it directly); one already
+        running still reaches `on_done`.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self._stats['misses'] += 1
+                return None
+            entry[2] = True
+            future = entry[1]
+        try:
+            question = future.result(timeout=wait)
+        except TimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            self._cancel([future])
+            return None
+        except Exception as e:
+            logger.warning(f"Prefetched advisor question unavailable for {session_id}: {e}")
+            question = None
+        with self._lock:
+            self._stats['hits' if question else 'misses'] += 1
+        return question
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['pending'] = self._pending
+        served = stats['hits'] + stats['misses'] + stats['timeouts']
+        stats['hit_ratio'] = round(stats['hits'] / served, 4) if served else 0.0
+        return stats
@@ -0,0 +1,52 @@
+"""
+Optional worker pre-warm. The app imports the PDF, OCR and HTTP stacks
+lazily so it starts fast; a worker that will serve traffic can instead pay
+those costs up front, after fork and before its first request, so the first
+upload or advisor call is not the slow one.
+
+Enabled with PREWARM=1: gunicorn.conf.py calls prewarm() from post_fork,
+and `python app.py` calls it before serving. PREWARM_OCR=1 also starts the
+OCR worker processes.
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREWARM = os.getenv('PREWARM', '0') == '1'
+PREWARM_OCR = os.getenv('PREWARM_OCR', '0') == '1'
+
+
+def _step(name, func):
+    start = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        logger.warning(f"Pre-warm step {name} failed: {e}")
+        return
+    logger.info(f"Pre-warmed {name} in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def _db_connection():
+    import db_pool
+    with db_pool.get_pool().connection():
+        pass
+
+
+def prewarm(pipeline=None, ocr=PREWARM_OCR, monitor=None):
+    """
+    Load the lazy libraries, open the Gemini session and a DB connection, and
+    start the health prober; each step is best-effort.
+    """
+    import extraction
+    import gemini_client
+    _step('pdf/ocr libraries', extraction.load_backends)
+    _step('gemini session', gemini_client.get_session)
+    if os.getenv('DB_URL'):
+        _step('db connection', _db_connection)
+    if monitor is not None:
+        _step('health probes', monitor.ensure_started)
+    if ocr and pipeline is not None:
+        _step('ocr workers', pipeline.prewarm)
@@ -0,0 +1,166 @@
+"""
+Server-side state for one user's session (upload -> form -> results -> advisor).
+Each step stores what it produced: the extracted upload fields, the saved
+financials, the results and the advisor's question. A later step, or a
+repeat of the same step, reads them back here instead of going to Postgres
+or Gemini again.
+
+Two tiers:
+- memory: a per-process LRU. With a shared tier behind it, entries are
+  trusted for only `memory_ttl` seconds, so writes from other workers show
+  up quickly.
+- shared: a SQLite file opened by every worker on the host (cache.SQLiteCache).
+
+SESSION_STORE=memory keeps only the first tier (one process).
+SESSION_STORE=sqlite (the default) adds the shared tier at SESSION_DB_PATH.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """session_id -> dict of step results, in memory and optionally a shared tier."""
+
+    def __init__(self, shared=None, ttl=3600, memory_ttl=30, max_entries=10000, encoder=None):
+        self.shared = shared
+        self.ttl = ttl
+        self.memory_ttl = memory_ttl if shared is not None else ttl
+        self.max_entries = max_entries
+        self.encoder = encoder
+        self._entries = OrderedDict()   # session_id -> (expires_at, state)
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+
+    def _remember(self, session_id, state):
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (time.monotonic() + self.memory_ttl, state)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def _load(self, session_id, fresh=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[0] > now and not (fresh and self.shared is not None):
+                self._entries.move_to_end(session_id)
+                self._stats['memory_hits'] += 1
+                return entry[1]
+            self._entries.pop(session_id, None)
+        state = self.shared.get(session_id) if self.shared is not None else None
+        with self._lock:
+            self._stats['shared_hits' if state is not None else 'misses'] += 1
+        if state is not None:
+            self._remember(session_id, state)
+        return state
+
+    def get(self, session_id, field=None, default=None, fresh=False):
+        """
+        The whole state (a copy, {} if unknown), or one `field` of it.
+        `fresh` reads the shared tier even when this process has a copy in memory.
+        """
+        if not session_id:
+            return default if field else {}
+        state = self._load(session_id, fresh) or {}
+        if field:
+            return state.get(field, default)
+        return dict(state)
+
+    def update(self, session_id, **fields):
+        """
+        Merge `fields` into the session's state in both tiers. With a shared
+        tier the merge happens there, in one transaction on the current row,
+        so fields written meanwhile by other workers are kept.
+        """
+        if not session_id:
+            return
+        state = self.shared.merge(session_id, fields) if self.shared is not None else None
+        if state is None:
+            state = dict(self._load(session_id) or {})
+            state.update(fields)
+            # Round-trip through JSON so both tiers hold the same types (Decimal -> float, ...)
+            state = json.loads(json.dumps(state, cls=self.encoder))
+        self._remember(session_id, state)
+        with self._lock:
+            self._stats['writes'] += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+        if self.shared is not None:
+            self.shared.delete(session_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        stats['backend'] = 'sqlite' if self.shared is not None else 'memory'
+        return stats
+
+
+def create_session_store_from_env(encoder=None):
+    """Build the store configured by the SESSION_* environment variables."""
+    backend = os.getenv('SESSION_STORE', 'sqlite')
+    ttl = int(os.getenv('SESSION_TTL_SECONDS', str(24 * 3600)))
+    max_entries = int(os.getenv('SESSION_MAX_ENTRIES', '10000'))
+    if backend == 'sqlite':
+        shared = SQLiteCache(
+            os.getenv('SESSION_DB_PATH', 'session_state.sqlite3'),
+            table='session_state',
+            ttl=ttl,
+            max_entries=int(os.getenv('SESSION_SHARED_MAX_ENTRIES', '100000')),
+            encoder=encoder,
+        )
+    elif backend == 'memory':
+        shared = None
+    else:
+        raise ValueError(f"Unknown SESSION_STORE: {backend}")
+    return SessionStore(
+        shared,
+        ttl=ttl,
+        memory_ttl=int(os.getenv('SESSION_MEMORY_TTL', '30')),
+        max_entries=max_entries,
+        encoder=encoder,
+    )
+
+
+def load_secret_key(path):
+    """
+    Flask's signing key: SECRET_KEY if set, else a key kept in `path` and
+    created on first start, so every worker and every restart shares it.
+    """
+    key = os.getenv('SECRET_KEY')
+    if key:
+        return key
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Write aside, then link into place: when workers start together the first link wins
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.urandom(32).hex())
+    try:
+        os.link(tmp, path)
+        logger.warning(f"SECRET_KEY is not set; generated one in {path}")
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(path) as f:
+        return f.read().strip()
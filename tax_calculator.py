@@ -1,43 +1,188 @@
 """
-Tax Calculation Engine for Indian Tax Regimes (FY 2024-25).
-Contains functions to calculate tax for both Old and New Regimes.
+Tax Calculation Engine for Indian Tax Regimes.
+Contains functions to calculate tax for both Old and New Regimes, driven by
+slab schedules keyed by regime and assessment year (default AY 2025-26, i.e. FY 2024-25).
+Each schedule also carries the Section 87A rebate and the surcharge bands
+(both with marginal relief); the Old Regime deducts the HRA exemption.
+Scalar helpers serve the web form; the *_batch helpers and calculate_batch
+evaluate whole columnar tables (payroll what-ifs) with NumPy.
 """
 
-def calculate_old_regime_tax(net_taxable_income):
-    """Calculates tax liability under the Old Tax Regime."""
-    tax = 0
-    if net_taxable_income <= 250000:
-        tax = 0
-    elif net_taxable_income <= 500000:
-        tax = (net_taxable_income - 250000) * 0.05
-    elif net_taxable_income <= 1000000:
-        tax = 12500 + (net_taxable_income - 500000) * 0.20
-    else:
-        tax = 112500 + (net_taxable_income - 1000000) * 0.30
-    
-    # Add 4% cess
-    cess = tax * 0.04
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+CESS_RATE = 0.04
+
+# FY 2024-25 -> AY 2025-26 is what the web form has always computed.
+DEFAULT_ASSESSMENT_YEAR = '2025-26'
+
+# Slab definitions keyed by (regime, assessment year).
+# Each entry lists (slab lower bound, marginal rate); the first slab starts at 0.
+_SLAB_DEFINITIONS = {
+    ('old', '2025-26'): (
+        (0, 0.0), (250000, 0.05), (500000, 0.20), (1000000, 0.30),
+    ),
+    ('new', '2025-26'): (
+        (0, 0.0), (300000, 0.05), (600000, 0.10), (900000, 0.15),
+        (1200000, 0.20), (1500000, 0.30),
+    ),
+    ('old', '2026-27'): (
+        (0, 0.0), (250000, 0.05), (500000, 0.20), (1000000, 0.30),
+    ),
+    ('new', '2026-27'): (
+        (0, 0.0), (400000, 0.05), (800000, 0.10), (1200000, 0.15),
+        (1600000, 0.20), (2000000, 0.25), (2400000, 0.30),
+    ),
+}
+
+# Section 87A rebate keyed by (regime, assessment year):
+# (net income limit, maximum rebate, marginal relief just above the limit).
+_REBATE_87A = {
+    ('old', '2025-26'): (500000, 12500, False),
+    ('new', '2025-26'): (700000, 25000, True),
+    ('old', '2026-27'): (500000, 12500, False),
+    ('new', '2026-27'): (1200000, 60000, True),
+}
+
+# Surcharge bands keyed by regime: (net income above which the rate applies, rate).
+# The New Regime caps the surcharge at 25%.
+_SURCHARGE_BANDS = {
+    'old': ((5000000, 0.10), (10000000, 0.15), (20000000, 0.25), (50000000, 0.37)),
+    'new': ((5000000, 0.10), (10000000, 0.15), (20000000, 0.25)),
+}
+
+# Section 10(13A) HRA exemption: the least of HRA received, rent paid in
+# excess of 10% of basic salary, and 50% (metro) / 40% (other cities) of basic.
+HRA_RENT_OVER_BASIC = 0.10
+HRA_BASIC_SHARE = {'metro': 0.50, 'non_metro': 0.40}
+
+SlabSchedule = namedtuple('SlabSchedule', [
+    'regime', 'assessment_year',
+    'bounds', 'rates', 'base_tax',                  # tuples, for bisect
+    'bounds_array', 'rates_array', 'base_tax_array',  # read-only arrays, for batches
+    'rebate_limit', 'rebate_max', 'rebate_marginal_relief',
+    'surcharge_bounds', 'surcharge_rates',
+    'surcharge_floor',      # tax + surcharge at each band's threshold, for marginal relief
+    'surcharge_bounds_array', 'surcharge_rates_array', 'surcharge_floor_array',
+])
+
+def _frozen_array(values):
+    array = np.array(values, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+def _build_schedule(regime, assessment_year, slabs, rebate, surcharge_bands):
+    """
+    Precomputes the cumulative tax payable at the start of every slab, and the
+    tax including surcharge at every surcharge threshold (the marginal relief cap).
+    """
+    bounds = tuple(float(lower) for lower, _ in slabs)
+    rates = tuple(float(rate) for _, rate in slabs)
+    base_tax = [0.0]
+    for i in range(1, len(bounds)):
+        base_tax.append(round(base_tax[-1] + (bounds[i] - bounds[i - 1]) * rates[i - 1], 2))
+    surcharge_bounds = tuple(float(lower) for lower, _ in surcharge_bands)
+    surcharge_rates = tuple(float(rate) for _, rate in surcharge_bands)
+    surcharge_floor = []
+    for i, threshold in enumerate(surcharge_bounds):
+        j = max(bisect_left(bounds, threshold) - 1, 0)
+        tax_at_threshold = base_tax[j] + (threshold - bounds[j]) * rates[j]
+        surcharge_floor.append(tax_at_threshold * (1 + (surcharge_rates[i - 1] if i else 0.0)))
+    rebate_limit, rebate_max, rebate_marginal_relief = rebate
+    return SlabSchedule(
+        regime, assessment_year,
+        bounds, rates, tuple(base_tax),
+        _frozen_array(bounds), _frozen_array(rates), _frozen_array(base_tax),
+        float(rebate_limit), float(rebate_max), rebate_marginal_relief,
+        surcharge_bounds, surcharge_rates, tuple(surcharge_floor),
+        _frozen_array(surcharge_bounds), _frozen_array(surcharge_rates), _frozen_array(surcharge_floor),
+    )
+
+# Built once at import time.
+SLAB_SCHEDULES = {
+    key: _build_schedule(key[0], key[1], slabs, _REBATE_87A[key], _SURCHARGE_BANDS[key[0]])
+    for key, slabs in _SLAB_DEFINITIONS.items()
+}
+
+def available_assessment_years():
+    """Assessment years with schedules for both regimes, newest first."""
+    years = {year for (_, year) in SLAB_SCHEDULES}
+    return sorted(
+        (y for y in years if ('old', y) in SLAB_SCHEDULES and ('new', y) in SLAB_SCHEDULES),
+        reverse=True,
+    )
+
+def get_slab_schedule(regime, assessment_year=None):
+    """Returns the SlabSchedule for a regime ('old'/'new') and assessment year."""
+    key = (regime, assessment_year or DEFAULT_ASSESSMENT_YEAR)
+    try:
+        return SLAB_SCHEDULES[key]
+    except KeyError:
+        raise ValueError(f"No slab schedule for regime={key[0]!r} assessment_year={key[1]!r}")
+
+def slab_rows(regime, assessment_year=None):
+    """(lower bound, upper bound or None for the top slab, rate) per slab, for display."""
+    schedule = get_slab_schedule(regime, assessment_year)
+    uppers = schedule.bounds[1:] + (None,)
+    return list(zip(schedule.bounds, uppers, schedule.rates))
+
+def slab_tax(net_taxable_income, schedule):
+    """Slab tax (before cess): one bisect plus one multiply."""
+    # Slab i covers (bounds[i], bounds[i+1]]; incomes at a bound stay in the lower slab.
+    i = max(bisect_left(schedule.bounds, net_taxable_income) - 1, 0)
+    return schedule.base_tax[i] + (net_taxable_income - schedule.bounds[i]) * schedule.rates[i]
+
+def rebate_87a(net_taxable_income, tax, schedule):
+    """Section 87A rebate on the slab tax; above the limit, marginal relief where the regime allows it."""
+    if net_taxable_income <= schedule.rebate_limit:
+        return min(tax, schedule.rebate_max)
+    if schedule.rebate_marginal_relief:
+        # Tax may not exceed the income earned above the rebate limit.
+        return max(0.0, tax - (net_taxable_income - schedule.rebate_limit))
+    return 0.0
+
+def surcharge(net_taxable_income, tax, schedule):
+    """Surcharge on the tax, with marginal relief at each band's threshold."""
+    i = bisect_left(schedule.surcharge_bounds, net_taxable_income) - 1
+    if i < 0:
+        return 0.0
+    with_surcharge = tax * (1 + schedule.surcharge_rates[i])
+    # Tax + surcharge may not exceed that at the threshold by more than the income above it.
+    relief_cap = schedule.surcharge_floor[i] + (net_taxable_income - schedule.surcharge_bounds[i])
+    return min(with_surcharge, relief_cap) - tax
+
+def income_tax(net_taxable_income, schedule):
+    """Tax before cess: slab tax less the 87A rebate, plus surcharge."""
+    tax = slab_tax(net_taxable_income, schedule)
+    tax = tax - rebate_87a(net_taxable_income, tax, schedule)
+    return tax + surcharge(net_taxable_income, tax, schedule)
+
+def calculate_tax(net_taxable_income, regime, assessment_year=None):
+    """Calculates tax liability (including 4% cess) for a regime and assessment year."""
+    tax = income_tax(net_taxable_income, get_slab_schedule(regime, assessment_year))
+    cess = tax * CESS_RATE
     return tax + cess
 
-def calculate_new_regime_tax(net_taxable_income):
+def calculate_old_regime_tax(net_taxable_income, assessment_year=None):
+    """Calculates tax liability under the Old Tax Regime."""
+    return calculate_tax(net_taxable_income, 'old', assessment_year)
+
+def calculate_new_regime_tax(net_taxable_income, assessment_year=None):
     """Calculates tax liability under the New Tax Regime (Default)."""
-    tax = 0
-    if net_taxable_income <= 300000:
-        tax = 0
-    elif net_taxable_income <= 600000:
-        tax = (net_taxable_income - 300000) * 0.05
-    elif net_taxable_income <= 900000:
-        tax = 15000 + (net_taxable_income - 600000) * 0.10
-    elif net_taxable_income <= 1200000:
-        tax = 45000 + (net_taxable_income - 900000) * 0.15
-    elif net_taxable_income <= 1500000:
-        tax = 90000 + (net_taxable_income - 1200000) * 0.20
-    else:
-        tax = 150000 + (net_taxable_income - 1500000) * 0.30
-        
-    # Add 4% cess
-    cess = tax * 0.04
-    return tax + cess
+    return calculate_tax(net_taxable_income, 'new', assessment_year)
+
+def is_metro(value):
+    """Form/CSV truthiness for the optional 'metro' flag."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on', 'metro')
+    return bool(value)
+
+def hra_exemption(basic_salary, hra_received, rent_paid, metro=False):
+    """Exempt part of the HRA received (Section 10(13A)); 0 when no rent is paid."""
+    share = HRA_BASIC_SHARE['metro' if metro else 'non_metro']
+    return max(0.0, min(hra_received, rent_paid - HRA_RENT_OVER_BASIC * basic_salary, share * basic_salary))
 
 def get_net_taxable_income_old(data):
     """Calculates net taxable income for the Old Regime after deductions."""
@@ -47,8 +192,13 @@ def get_net_taxable_income_old(data):
         float(data.get('standard_deduction', 0)) +
         float(data.get('professional_tax', 0)) +
         float(data.get('deduction_80c', 0)) +
-        float(data.get('deduction_80d', 0))
-        # Add HRA calculation here if needed
+        float(data.get('deduction_80d', 0)) +
+        hra_exemption(
+            float(data.get('basic_salary') or 0),
+            float(data.get('hra_received') or 0),
+            float(data.get('rent_paid') or 0),
+            is_metro(data.get('metro')),
+        )
     )
     return max(0, gross - deductions)
 
@@ -57,4 +207,241 @@ def get_net_taxable_income_new(data):
     gross = float(data.get('gross_salary', 0))
     # Only standard deduction is available
     deductions = float(data.get('standard_deduction', 0))
-    return max(0, gross - deductions) 
\ No newline at end of file
+    return max(0, gross - deductions) 
+
+# ---------------------------------------------------------------------------
+# Batch (vectorized) engine
+# ---------------------------------------------------------------------------
+
+# UserFinancials columns that feed the tax computation, in table order.
+FINANCIAL_FIELDS = (
+    'gross_salary', 'basic_salary', 'hra_received', 'rent_paid',
+    'deduction_80c', 'deduction_80d', 'standard_deduction',
+    'professional_tax', 'tds',
+)
+
+def _column(table, field, length):
+    """Returns one column of a columnar table as a float64 array (0 if absent)."""
+    try:
+        values = table[field]
+    except (KeyError, IndexError, ValueError):
+        return np.zeros(length, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64).reshape(-1)
+
+def to_columns(table):
+    """
+    Normalizes a columnar table into a dict of float64 arrays, one per financial field
+    plus the optional numeric 'metro' flag (1 = metro city).
+    Accepts anything indexable by column name: a dict of lists/arrays, a pandas
+    DataFrame or a NumPy structured array. Missing columns are treated as 0,
+    matching the scalar helpers' data.get(field, 0).
+    """
+    length = None
+    for field in FINANCIAL_FIELDS:
+        try:
+            length = len(table[field])
+            break
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+    if length is None:
+        raise ValueError("table has none of the UserFinancials columns")
+    return {field: _column(table, field, length) for field in FINANCIAL_FIELDS + ('metro',)}
+
+def hra_exemption_batch(columns):
+    """Vectorized hra_exemption over a dict of float64 columns."""
+    share = np.where(columns['metro'] != 0, HRA_BASIC_SHARE['metro'], HRA_BASIC_SHARE['non_metro'])
+    basic = columns['basic_salary']
+    exemption = np.minimum(np.minimum(columns['hra_received'], columns['rent_paid'] - HRA_RENT_OVER_BASIC * basic),
+                           share * basic)
+    return np.maximum(0.0, exemption)
+
+def get_net_taxable_income_old_batch(columns):
+    """Vectorized get_net_taxable_income_old over a dict of float64 columns."""
+    deductions = (
+        columns['standard_deduction'] +
+        columns['professional_tax'] +
+        columns['deduction_80c'] +
+        columns['deduction_80d'] +
+        hra_exemption_batch(columns)
+    )
+    return np.maximum(0, columns['gross_salary'] - deductions)
+
+def get_net_taxable_income_new_batch(columns):
+    """Vectorized get_net_taxable_income_new over a dict of float64 columns."""
+    return np.maximum(0, columns['gross_salary'] - columns['standard_deduction'])
+
+def slab_tax_batch(net_taxable_income, schedule):
+    """Vectorized slab_tax: searchsorted over the precomputed breakpoints."""
+    x = np.asarray(net_taxable_income, dtype=np.float64)
+    i = np.maximum(np.searchsorted(schedule.bounds_array, x, side='left') - 1, 0)
+    return schedule.base_tax_array[i] + (x - schedule.bounds_array[i]) * schedule.rates_array[i]
+
+def rebate_87a_batch(net_taxable_income, tax, schedule):
+    """Vectorized rebate_87a."""
+    x = np.asarray(net_taxable_income, dtype=np.float64)
+    over_limit = x > schedule.rebate_limit
+    rebate = np.where(over_limit, 0.0, np.minimum(tax, schedule.rebate_max))
+    if schedule.rebate_marginal_relief:
+        rebate = np.where(over_limit, np.maximum(0.0, tax - (x - schedule.rebate_limit)), rebate)
+    return rebate
+
+def surcharge_batch(net_taxable_income, tax, schedule):
+    """Vectorized surcharge."""
+    x = np.asarray(net_taxable_income, dtype=np.float64)
+    i = np.searchsorted(schedule.surcharge_bounds_array, x, side='left') - 1
+    band = np.maximum(i, 0)
+    with_surcharge = tax * (1 + schedule.surcharge_rates_array[band])
+    relief_cap = schedule.surcharge_floor_array[band] + (x - schedule.surcharge_bounds_array[band])
+    return np.where(i >= 0, np.minimum(with_surcharge, relief_cap) - tax, 0.0)
+
+def income_tax_batch(net_taxable_income, schedule):
+    """Vectorized income_tax: (tax, rebate, surcharge) arrays, tax before cess."""
+    tax = slab_tax_batch(net_taxable_income, schedule)
+    rebate = rebate_87a_batch(net_taxable_income, tax, schedule)
+    tax = tax - rebate
+    extra = surcharge_batch(net_taxable_income, tax, schedule)
+    return tax + extra, rebate, extra
+
+def old_regime_tax_batch(net_taxable_income, assessment_year=None):
+    """Vectorized Old Regime tax (before cess)."""
+    return income_tax_batch(net_taxable_income, get_slab_schedule('old', assessment_year))[0]
+
+def new_regime_tax_batch(net_taxable_income, assessment_year=None):
+    """Vectorized New Regime tax (before cess)."""
+    return income_tax_batch(net_taxable_income, get_slab_schedule('new', assessment_year))[0]
+
+def calculate_batch(table, assessment_year=None):
+    """
+    Computes both regimes for a whole columnar table in one vectorized pass.
+    Returns a dict of float64 arrays: net_income_*, rebate_*, surcharge_*,
+    tax_* (before cess), cess_* and total_* for the old and new regimes.
+    total_* equals calculate_*_regime_tax row by row.
+    """
+    columns = to_columns(table)
+    net_old = get_net_taxable_income_old_batch(columns)
+    net_new = get_net_taxable_income_new_batch(columns)
+    tax_old, rebate_old, surcharge_old = income_tax_batch(net_old, get_slab_schedule('old', assessment_year))
+    tax_new, rebate_new, surcharge_new = income_tax_batch(net_new, get_slab_schedule('new', assessment_year))
+    cess_old = tax_old * CESS_RATE
+    cess_new = tax_new * CESS_RATE
+    return {
+        'net_income_old': net_old,
+        'rebate_old': rebate_old,
+        'surcharge_old': surcharge_old,
+        'tax_old': tax_old,
+        'cess_old': cess_old,
+        'total_old': tax_old + cess_old,
+        'net_income_new': net_new,
+        'rebate_new': rebate_new,
+        'surcharge_new': surcharge_new,
+        'tax_new': tax_new,
+        'cess_new': cess_new,
+        'total_new': tax_new + cess_new,
+    }
+
+# ---------------------------------------------------------------------------
+# Regime optimizer (what-if analysis)
+# ---------------------------------------------------------------------------
+
+# Statutory caps for the Old Regime deductions the form collects.
+# 80D: self/family cover for an individual under 60.
+DEDUCTION_LIMITS = {
+    'deduction_80c': 150000.0,
+    'deduction_80d': 25000.0,
+}
+
+def _profile(data):
+    """Financial fields of a form/DB row as floats (None or blank -> 0), plus the metro flag."""
+    profile = {field: float(data.get(field) or 0) for field in FINANCIAL_FIELDS}
+    profile['metro'] = 1.0 if is_metro(data.get('metro')) else 0.0
+    return profile
+
+def _totals(profile, assessment_year=None):
+    """(old total, new total) including cess for one profile."""
+    old = calculate_old_regime_tax(get_net_taxable_income_old(profile), assessment_year)
+    new = calculate_new_regime_tax(get_net_taxable_income_new(profile), assessment_year)
+    return old, new
+
+def deduction_headroom(data):
+    """Old Regime deductions still claimable before the DEDUCTION_LIMITS caps (80C + 80D)."""
+    profile = _profile(data)
+    return sum(max(0.0, limit - profile[category]) for category, limit in DEDUCTION_LIMITS.items())
+
+def break_even_deduction(data, assessment_year=None):
+    """
+    Extra Old Regime deduction (in rupees) at which the Old Regime costs the
+    same as the New Regime; 0 if the Old Regime is already no more expensive.
+    Old Regime tax is non-decreasing in income, so this is a bisection.
+    """
+    profile = _profile(data)
+    old, new = _totals(profile, assessment_year)
+    if old <= new:
+        return 0.0
+    base_net = get_net_taxable_income_old(profile)
+    low, high = 0.0, base_net
+    while high - low > 1.0:
+        mid = (low + high) / 2
+        if calculate_old_regime_tax(base_net - mid, assessment_year) <= new:
+            high = mid
+        else:
+            low = mid
+    return float(np.ceil(high))
+
+def marginal_savings(data, category, assessment_year=None, points=11):
+    """
+    Savings curve for adding up to the remaining headroom in one deduction
+    category: `points` evenly spaced extra amounts, evaluated in one batch.
+    Each point has the extra amount, the Old Regime total, the saving against
+    today's Old Regime total and the best total across both regimes.
+    """
+    profile = _profile(data)
+    limit = DEDUCTION_LIMITS[category]
+    headroom = max(0.0, limit - profile[category])
+    extra = np.linspace(0.0, headroom, max(points, 2)) if headroom else np.zeros(1)
+    table = {field: np.full(len(extra), value) for field, value in profile.items()}
+    table[category] = profile[category] + extra
+    result = calculate_batch(table, assessment_year)
+    best = np.minimum(result['total_old'], result['total_new'])
+    savings = result['total_old'][0] - result['total_old']
+    return {
+        'claimed': profile[category],
+        'limit': limit,
+        'headroom': headroom,
+        'curve': [
+            {
+                'extra': round(float(extra[i]), 2),
+                'tax_old': round(float(result['total_old'][i]), 2),
+                'savings': round(float(savings[i]), 2),
+                'best_total': round(float(best[i]), 2),
+            }
+            for i in range(len(extra))
+        ],
+    }
+
+def optimize(data, assessment_year=None, points=11):
+    """
+    What-if summary for one profile: both regime totals, the recommended
+    regime, the break-even extra deduction, the Old Regime's current marginal
+    rate (with cess) and a marginal savings curve per deduction category.
+    """
+    profile = _profile(data)
+    assessment_year = assessment_year or DEFAULT_ASSESSMENT_YEAR
+    old, new = _totals(profile, assessment_year)
+    net_old = get_net_taxable_income_old(profile)
+    schedule = get_slab_schedule('old', assessment_year)
+    rate = schedule.rates[max(bisect_left(schedule.bounds, net_old) - 1, 0)]
+    breakeven = break_even_deduction(profile, assessment_year)
+    headroom = deduction_headroom(profile)
+    return {
+        'assessment_year': assessment_year,
+        'tax_old_regime': round(old, 2),
+        'tax_new_regime': round(new, 2),
+        'recommended_regime': 'old' if old < new else 'new',
+        'break_even_deduction': breakeven,
+        'break_even_within_limits': breakeven <= headroom,
+        'marginal_rate_old': round(rate * (1 + CESS_RATE), 4),
+        'categories': {
+            category: marginal_savings(profile, category, assessment_year, points)
+            for category in DEDUCTION_LIMITS
+        },
+    }
@@ -0,0 +1,164 @@
+"""
+Access to the UserFinancials table.
+- bulk_upsert() loads many rows per round-trip instead of one INSERT ... ON
+  CONFLICT per row: either COPY into a temporary staging table followed by a
+  single merging INSERT ... SELECT, or execute_values batches.
+- UserFinancialsCache is a per-process read-through cache of session rows,
+  written through by /calculate, so advisor pages skip the DB round-trip.
+"""
+
+import io
+import csv
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+from psycopg2.extras import execute_values
+
+import tax_calculator
+
+logger = logging.getLogger(__name__)
+
+# The amounts plus the metro flag the HRA exemption depends on.
+STORED_FIELDS = tax_calculator.FINANCIAL_FIELDS + ('metro',)
+COLUMNS = ('session_id',) + STORED_FIELDS
+
+# Only what the advisor and the tax calculation use (no created_at).
+SELECT_SQL = f"SELECT {', '.join(COLUMNS)} FROM UserFinancials WHERE session_id = %s"
+
+_UPDATE_SET = ',\n        '.join(f"{c} = EXCLUDED.{c}" for c in STORED_FIELDS)
+
+_MERGE_FROM_STAGING_SQL = f"""
+    INSERT INTO UserFinancials ({', '.join(COLUMNS)})
+    SELECT {', '.join(COLUMNS)} FROM userfinancials_staging
+    ON CONFLICT (session_id) DO UPDATE SET
+        {_UPDATE_SET};
+"""
+
+_UPSERT_VALUES_SQL = f"""
+    INSERT INTO UserFinancials ({', '.join(COLUMNS)})
+    VALUES %s
+    ON CONFLICT (session_id) DO UPDATE SET
+        {_UPDATE_SET};
+"""
+
+
+def _amount(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        value = value.strip().replace(',', '')
+        return value or 0
+    return value
+
+
+def _normalize(rows):
+    """
+    One tuple per session in COLUMNS order; the last row wins for a repeated
+    session_id (a single merge can't update the same row twice). Rows without
+    a session_id get a new one, written back into the row dict.
+    """
+    by_session = {}
+    for row in rows:
+        if not row.get('session_id'):
+            row['session_id'] = str(uuid.uuid4())
+        by_session[row['session_id']] = (row['session_id'],) + tuple(
+            _amount(row.get(field)) for field in tax_calculator.FINANCIAL_FIELDS
+        ) + (tax_calculator.is_metro(row.get('metro')),)
+    return list(by_session.values())
+
+
+def bulk_upsert(conn, rows, method='copy', page_size=1000):
+    """
+    Upsert row dicts (UserFinancials columns) in one transaction.
+    method='copy'   -> COPY into a temp staging table, then one merge.
+    method='values' -> execute_values batches of `page_size` rows.
+    Returns (rows written, seconds).
+    """
+    start = time.perf_counter()
+    records = _normalize(rows)
+    if not records:
+        return 0, 0.0
+    with conn.cursor() as cur:
+        if method == 'copy':
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS userfinancials_staging "
+                "(LIKE UserFinancials INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(records)
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY userfinancials_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cur.execute(_MERGE_FROM_STAGING_SQL)
+        elif method == 'values':
+            execute_values(cur, _UPSERT_VALUES_SQL, records, page_size=page_size)
+        else:
+            raise ValueError(f"Unknown bulk upsert method: {method}")
+    conn.commit()
+    seconds = time.perf_counter() - start
+    logger.info(f"Upserted {len(records)} UserFinancials rows via {method} "
+                f"in {seconds:.2f}s ({len(records) / seconds if seconds else 0:,.0f} rows/s)")
+    return len(records), seconds
+
+
+class UserFinancialsCache:
+    """
+    Bounded, TTL-limited map of session_id -> user row, in front of `fetch`
+    (a callable session_id -> row dict or None). Misses are not cached, so a
+    session saved later is picked up on the next read. Each process has its
+    own cache; rows written elsewhere are seen once `ttl` expires.
+    """
+
+    def __init__(self, fetch, ttl=300, max_entries=10000):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # session_id -> (expires_at, row)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'invalidations': 0, 'evicted': 0}
+
+    def get(self, session_id):
+        """The session's row (a copy), from memory if fresh, else via `fetch`."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(session_id)
+                self._stats['hits'] += 1
+                return dict(entry[1])
+            self._entries.pop(session_id, None)
+            self._stats['misses'] += 1
+        row = self.fetch(session_id)
+        if row is not None:
+            self.put(session_id, row, count=False)
+        return dict(row) if row is not None else None
+
+    def put(self, session_id, row, count=True):
+        """Write-through: store a freshly saved row."""
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (time.monotonic() + self.ttl, dict(row))
+            if count:
+                self._stats['writes'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def invalidate(self, session_id):
+        with self._lock:
+            if self._entries.pop(session_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['db_round_trips_saved'] = stats['hits']
+        return stats